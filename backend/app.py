@@ -6,7 +6,11 @@ from flask import Flask, jsonify
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from config import get_config
+from logging.handlers import QueueHandler, QueueListener
+import atexit
+import logging
 import os
+import queue
 
 # Import blueprints
 from routes.auth import auth_bp
@@ -19,6 +23,44 @@ from routes.chatbot.chat import chat_bp
 # Import database
 from database import init_db, close_db
 
+# Import background document processing
+from utils.document_processor import start_pipeline
+
+# Loggers of the Ollama/OCR helpers and the document pipeline (configured in configure_ai_logging)
+AI_LOGGERS = ('utils.ai_cache', 'utils.ai_categorizer', 'utils.ai_chatbot', 'utils.ai_tagger',
+              'utils.document_processor', 'utils.ocr_helper', 'utils.ollama_helper')
+
+# Hands records from worker threads to a single writer thread (see configure_ai_logging)
+_ai_log_handler = None
+
+
+def configure_ai_logging():
+    """
+    Log AI helpers at INFO to stderr; debug output (prompt/response previews) only with AI_DEBUG=1
+    Records go through a queue to one listener thread, so processing threads
+    never wait on each other for the stderr write
+    """
+    global _ai_log_handler
+    
+    level = logging.DEBUG if os.environ.get('AI_DEBUG') == '1' else logging.INFO
+    
+    if _ai_log_handler is None:
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(logging.Formatter('%(message)s'))
+        
+        log_queue = queue.SimpleQueue()
+        listener = QueueListener(log_queue, stream_handler)
+        listener.start()
+        atexit.register(listener.stop)  # Flush queued records on shutdown
+        _ai_log_handler = QueueHandler(log_queue)
+    
+    for name in AI_LOGGERS:
+        logger = logging.getLogger(name)
+        logger.setLevel(level)
+        if not logger.handlers:
+            logger.addHandler(_ai_log_handler)
+        logger.propagate = False
+
 
 def create_app(config_name=None):
     """Application factory pattern"""
@@ -31,6 +73,8 @@ def create_app(config_name=None):
     config_class = get_config()
     app.config.from_object(config_class)
     
+    configure_ai_logging()
+    
     # Disable strict slashes to avoid 308 redirects
     app.url_map.strict_slashes = False
     
@@ -59,6 +103,9 @@ def create_app(config_name=None):
     app.register_blueprint(stats_bp, url_prefix='/api/stats')
     app.register_blueprint(chat_bp, url_prefix='/api/chat')
     
+    # Start OCR -> AI document processing workers
+    start_pipeline(app)
+    
     # Health check endpoint
     @app.route('/api/health', methods=['GET'])
     def health_check():
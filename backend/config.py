@@ -24,8 +24,8 @@ class Config:
     
     # File Upload
     MAX_CONTENT_LENGTH = 100 * 1024 * 1024  # 100MB
-    ALLOWED_EXTENSIONS = {'pdf', 'doc', 'docx', 'xls', 'xlsx', 'ppt', 'pptx', 'txt', 'csv', 
-                          'jpg', 'jpeg', 'png', 'tiff', 'tif', 'bmp'}  # Image formats for OCR
+    ALLOWED_EXTENSIONS = frozenset({'pdf', 'doc', 'docx', 'xls', 'xlsx', 'ppt', 'pptx', 'txt', 'csv', 
+                                    'jpg', 'jpeg', 'png', 'tiff', 'tif', 'bmp'})  # Image formats for OCR
     
     # Ollama Configuration
     OLLAMA_BASE_URL = os.environ.get('OLLAMA_BASE_URL') or 'http://localhost:11434'
@@ -36,6 +36,11 @@ class Config:
     # Available models on the server (comma-separated, will be auto-detected if empty)
     OLLAMA_AVAILABLE_MODELS = os.environ.get('OLLAMA_AVAILABLE_MODELS', '').split(',') if os.environ.get('OLLAMA_AVAILABLE_MODELS') else []
     
+    # Model cascade for categorization/tagging: small model first, large model on low confidence
+    # Opt-in - set TIER_SMALL_MODEL (e.g. llama3.2:1b-instruct-q4_K_M) to a model pulled on the server
+    TIER_SMALL_MODEL = os.environ.get('TIER_SMALL_MODEL', '')
+    TIER_LARGE_MODEL = os.environ.get('TIER_LARGE_MODEL') or OLLAMA_MODEL
+    
     # Streaming Configuration
     ENABLE_STREAMING = os.environ.get('ENABLE_STREAMING', 'true').lower() == 'true'
     
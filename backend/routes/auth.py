@@ -5,7 +5,7 @@ Login, Register, Logout, Token Refresh
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from database import execute_query, get_cursor
-from utils.auth_helper import hash_password, verify_password, create_tokens, format_user_response
+from utils.auth_helper import hash_password, verify_password, password_needs_rehash, create_tokens, format_user_response
 from utils.validators import validate_email, validate_password, validate_required_fields
 from datetime import datetime
 
@@ -111,6 +111,14 @@ def login():
         if not verify_password(user['password_hash'], password):
             return jsonify({'error': 'Invalid email or password'}), 401
         
+        # Upgrade legacy PBKDF2 hashes to argon2 now that we have the plain password
+        if password_needs_rehash(user['password_hash']):
+            execute_query(
+                "UPDATE users SET password_hash = %s WHERE id = %s",
+                (hash_password(password), user['id']),
+                commit=True
+            )
+        
         # Update last login
         execute_query(
             "UPDATE users SET last_login = %s WHERE id = %s",
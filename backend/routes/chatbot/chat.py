@@ -12,6 +12,9 @@ import time
 
 chat_bp = Blueprint('chat', __name__)
 
+# Most recent messages loaded as chatbot history (the prompt uses the last 6)
+CHAT_HISTORY_LIMIT = 12
+
 
 def get_user_id():
     """Helper to get current user ID from JWT"""
@@ -35,6 +38,26 @@ def validate_document_access(document_id: int, user_id: int) -> bool:
         return False
 
 
+def get_recent_history(session_id: int) -> list:
+    """Get the latest CHAT_HISTORY_LIMIT messages of a session, oldest first"""
+    previous_messages = execute_query(
+        """
+        SELECT role, content
+        FROM chat_messages
+        WHERE session_id = %s
+        ORDER BY created_at DESC, id DESC
+        LIMIT %s
+        """,
+        (session_id, CHAT_HISTORY_LIMIT),
+        fetch_all=True
+    )
+    
+    return [
+        {'role': msg['role'], 'content': msg['content']}
+        for msg in reversed(previous_messages)
+    ]
+
+
 @chat_bp.route('/sessions', methods=['POST'])
 @jwt_required()
 def create_session():
@@ -352,22 +375,8 @@ def send_message_stream(session_id):
         else:
             print(f"ℹ️ No document specified - will search across user's documents")
         
-        # Get chat history for context
-        previous_messages = execute_query(
-            """
-            SELECT role, content
-            FROM chat_messages
-            WHERE session_id = %s
-            ORDER BY created_at ASC
-            """,
-            (session_id,),
-            fetch_all=True
-        )
-
-        chat_history = [
-            {'role': msg['role'], 'content': msg['content']}
-            for msg in previous_messages
-        ]
+        # Get chat history for context (bounded - older turns are never used)
+        chat_history = get_recent_history(session_id)
 
         # Save user message
         user_message_id = execute_query(
@@ -382,144 +391,34 @@ def send_message_stream(session_id):
         # Prepare streaming response
         def generate_stream():
             try:
-                # Check if document was selected but has error (no extracted text)
-                if target_document_id and document_context and 'error' in document_context:
-                    error_msg = document_context['error']
-                    document_name = document_context.get('document_name', 'the selected document')
-                    
-                    # Generate helpful error message
-                    if 'no extractable text' in error_msg.lower() or 'no extracted text' in error_msg.lower():
-                        response_text = f"I see you've selected the document '{document_name}', but it doesn't have any extractable text content yet. This could mean:\n\n1. The document is still being processed\n2. The document is a scanned image that needs OCR processing\n3. The document may be empty or corrupted\n\nPlease try:\n- Wait a moment if the document is still processing\n- Check if OCR processing is needed for this document\n- Or select a different document that has been fully processed"
-                    else:
-                        response_text = f"I encountered an issue with the selected document '{document_name}': {error_msg}\n\nPlease try selecting a different document or contact support if the problem persists."
-                    
-                    # Save assistant error message
-                    metadata = {'error': error_msg, 'sources': []}
-                    assistant_message_id = execute_query(
-                        """
-                        INSERT INTO chat_messages (session_id, role, content, metadata)
-                        VALUES (%s, 'assistant', %s, %s)
-                        """,
-                        (session_id, response_text, json.dumps(metadata)),
-                        commit=True
-                    )
-                    
-                    # Update session
-                    execute_query(
-                        "UPDATE chat_sessions SET updated_at = NOW() WHERE id = %s",
-                        (session_id,),
-                        commit=True
-                    )
-                    
-                    # Send error response as stream
-                    yield f"data: {json.dumps({'type': 'start', 'userMessageId': user_message_id, 'sources': []})}\n\n"
-                    # Stream the error message character by character for consistency
-                    for char in response_text:
-                        yield f"data: {json.dumps({'type': 'chunk', 'content': char})}\n\n"
-                    yield f"data: {json.dumps({'type': 'done', 'assistantMessageId': assistant_message_id, 'fullResponse': response_text, 'sources': []})}\n\n"
-                    return
-                
-                # Prepare context for AI
-                context_text = ""
-                sources = []
-                
-                if document_context and 'error' not in document_context:
-                    context_text = f"""
-Document: {document_context['document_name']}
-Document ID: {document_context['document_id']}
-
-Document Content:
-{document_context['text']}
-"""
-                    sources.append({
-                        'document_id': document_context['document_id'],
-                        'document_name': document_context['document_name']
-                    })
-                elif user_id and not target_document_id:
-                    relevant_docs = chatbot.search_user_documents(message_content, user_id, limit=2)
-                    if relevant_docs:
-                        context_text = "Relevant Documents:\n\n"
-                        for doc in relevant_docs:
-                            context_text += f"Document: {doc['document_name']}\nContent: {doc['text']}\n\n"
-                            sources.append({
-                                'document_id': doc['document_id'],
-                                'document_name': doc['document_name']
-                            })
-                
-                # Build system prompt
-                has_document_context = bool(context_text)
-                if has_document_context:
-                    system_prompt = """You are a helpful document assistant. Answer questions about documents accurately and concisely."""
-                else:
-                    system_prompt = """You are a helpful AI assistant. Answer questions clearly and concisely."""
-                
-                # Build user prompt
-                history_context = ""
-                if chat_history:
-                    recent_history = chat_history[-6:]
-                    history_context = "\n\nPrevious conversation:\n"
-                    for msg in recent_history:
-                        history_context += f"{msg['role'].capitalize()}: {msg['content']}\n"
-                
-                user_prompt = f"""{context_text}{history_context}
-
-User Question: {message_content}
-
-Please provide a clear, accurate answer."""
+                # Prompt building, model selection and caching are shared with
+                # send_message via AIChatbot.stream_response
+                events = chatbot.stream_response(
+                    question=message_content,
+                    document_context=document_context,
+                    chat_history=chat_history,
+                    user_id=user_id if not target_document_id else None
+                )
                 
-                # Select model (smart selection)
-                if chatbot.use_smart_selection:
-                    context_length = len(context_text) if context_text else 0
-                    has_multiple_docs = len(sources) > 1
-                    
-                    from utils.model_selector import ModelSelector
-                    from flask import current_app
-                    import os
-                    
-                    base_url = None
-                    try:
-                        base_url = current_app.config.get('OLLAMA_BASE_URL')
-                    except RuntimeError:
-                        base_url = os.environ.get('OLLAMA_BASE_URL', 'http://localhost:11434')
+                for event in events:
+                    if event['type'] == 'start':
+                        yield f"data: {json.dumps({'type': 'start', 'userMessageId': user_message_id, 'sources': event['sources']})}\n\n"
                     
-                    model_config = ModelSelector.select_model_with_availability_check(
-                        question=message_content,
-                        document_context_length=context_length,
-                        has_multiple_documents=has_multiple_docs,
-                        base_url=base_url
-                    )
+                    elif event['type'] == 'chunk':
+                        yield f"data: {json.dumps({'type': 'chunk', 'content': event['content']})}\n\n"
                     
-                    if model_config['model'] != chatbot.ollama.model:
-                        chatbot.ollama.set_model(model_config['model'])
-                    
-                    temperature = model_config['temperature']
-                else:
-                    temperature = 0.3
-                
-                # Stream response
-                full_response = ""
-                messages = [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ]
-                
-                # Send initial metadata
-                yield f"data: {json.dumps({'type': 'start', 'userMessageId': user_message_id, 'sources': sources})}\n\n"
-                
-                # Stream from Ollama
-                for chunk in chatbot.ollama.chat_stream(messages, temperature=temperature):
-                    if chunk.get('error'):
-                        yield f"data: {json.dumps({'type': 'error', 'error': chunk['error']})}\n\n"
+                    elif event['type'] == 'error':
+                        yield f"data: {json.dumps({'type': 'error', 'error': event['error']})}\n\n"
                         break
                     
-                    content = chunk.get('content', '')
-                    if content:
-                        full_response += content
-                        yield f"data: {json.dumps({'type': 'chunk', 'content': content})}\n\n"
-                    
-                    if chunk.get('done'):
+                    elif event['type'] == 'done':
+                        full_response = event['response']
+                        sources = event['sources']
+                        
                         # Save assistant message
                         metadata = {'sources': sources}
+                        if event.get('error'):
+                            metadata['error'] = event['error']
                         assistant_message_id = execute_query(
                             """
                             INSERT INTO chat_messages (session_id, role, content, metadata)
@@ -538,7 +437,6 @@ Please provide a clear, accurate answer."""
                         
                         # Send final message
                         yield f"data: {json.dumps({'type': 'done', 'assistantMessageId': assistant_message_id, 'fullResponse': full_response, 'sources': sources})}\n\n"
-                        break
                 
             except Exception as e:
                 print(f"❌ Streaming error: {str(e)}")
@@ -625,22 +523,8 @@ def send_message(session_id):
         else:
             print(f"ℹ️ No document specified - will search across user's documents")
         
-        # Get chat history for context
-        previous_messages = execute_query(
-            """
-            SELECT role, content
-            FROM chat_messages
-            WHERE session_id = %s
-            ORDER BY created_at ASC
-            """,
-            (session_id,),
-            fetch_all=True
-        )
-        
-        chat_history = [
-            {'role': msg['role'], 'content': msg['content']}
-            for msg in previous_messages
-        ]
+        # Get chat history for context (bounded - older turns are never used)
+        chat_history = get_recent_history(session_id)
         
         # Save user message
         user_message_id = execute_query(
@@ -8,9 +8,10 @@ from werkzeug.utils import secure_filename
 from database import execute_query, get_cursor
 from utils.s3_helper import upload_file, download_file, get_processing_status
 from utils.validators import validate_file_type, get_file_extension, sanitize_filename
+from utils.ai_chatbot import invalidate_document_context
+from utils import json_utils
 import os
 import tempfile
-import json
 
 documents_bp = Blueprint('documents', __name__)
 
@@ -123,7 +124,7 @@ def get_documents():
                 'processingStatus': doc.get('processing_status'),
                 'suggestedCategory': doc.get('suggested_category'),
                 # ai_tags is JSON; return as-is, frontend can handle null / list
-                'aiTags': json.loads(doc['ai_tags']) if doc.get('ai_tags') else None,
+                'aiTags': json_utils.loads(doc['ai_tags']) if doc.get('ai_tags') else None,
             })
         
         return jsonify({
@@ -185,7 +186,7 @@ def get_document(doc_id):
                 'status': document.get('status'),
                 'processingStatus': document.get('processing_status'),
                 'suggestedCategory': document.get('suggested_category'),
-                'aiTags': json.loads(document['ai_tags']) if document.get('ai_tags') else None,
+                'aiTags': json_utils.loads(document['ai_tags']) if document.get('ai_tags') else None,
             }
         }), 200
         
@@ -309,6 +310,8 @@ def upload_document():
             file_type_lower = file_extension.lower()
             needs_processing = file_type_lower in ['jpg', 'jpeg', 'png', 'tiff', 'tif', 'bmp', 'pdf']
             
+            processing = 'not_needed'
+            
             if needs_processing:
                 try:
                     from utils.document_processor import DocumentProcessor
@@ -316,13 +319,18 @@ def upload_document():
                     app = current_app._get_current_object()
                     processor = DocumentProcessor(app=app)
                     # Process in background (file will be cleaned up by processor)
-                    processor.process_async(
+                    if processor.process_async(
                         document_id=doc_id,
                         file_path=temp_path,
                         file_type=file_extension
-                    )
-                    print(f"✅ Background processing started for document {doc_id}")
+                    ):
+                        processing = 'started'
+                        print(f"✅ Background processing started for document {doc_id}")
+                    else:
+                        processing = 'queue_full'
+                        print(f"⚠️ Processing queue full, document {doc_id} marked failed")
                 except Exception as proc_error:
+                    processing = 'failed'
                     print(f"⚠️ Failed to start background processing: {str(proc_error)}")
                     # Don't fail the upload if processing setup fails
                     # Clean up temp file manually
@@ -370,10 +378,10 @@ def upload_document():
                     'url': document['s3_url'],
                     'status': document['status'],
                     'suggestedCategory': document.get('suggested_category'),
-                    'aiTags': json.loads(document.get('ai_tags')) if document.get('ai_tags') else None
+                    'aiTags': json_utils.loads(document.get('ai_tags')) if document.get('ai_tags') else None
                 },
                 'uploadResult': upload_result,
-                'processing': 'started' if needs_processing else 'not_needed'
+                'processing': processing
             }), 201
             
         finally:
@@ -496,18 +504,25 @@ def upload_document_auto():
             file_type_lower = file_extension.lower()
             needs_processing = file_type_lower in ['jpg', 'jpeg', 'png', 'tiff', 'tif', 'bmp', 'pdf']
             
+            processing = 'not_needed'
+            
             if needs_processing:
                 try:
                     from utils.document_processor import DocumentProcessor
                     app = current_app._get_current_object()
                     processor = DocumentProcessor(app=app)
-                    processor.process_async(
+                    if processor.process_async(
                         document_id=doc_id,
                         file_path=temp_path,
                         file_type=file_extension
-                    )
-                    print(f"✅ [AUTO] Background processing started for document {doc_id}")
+                    ):
+                        processing = 'started'
+                        print(f"✅ [AUTO] Background processing started for document {doc_id}")
+                    else:
+                        processing = 'queue_full'
+                        print(f"⚠️ [AUTO] Processing queue full, document {doc_id} marked failed")
                 except Exception as proc_error:
+                    processing = 'failed'
                     print(f"⚠️ [AUTO] Failed to start background processing: {str(proc_error)}")
                     # Don't fail the upload if processing setup fails
                     if os.path.exists(temp_path):
@@ -555,10 +570,10 @@ def upload_document_auto():
                     'url': document['s3_url'],
                     'status': document['status'],
                     'suggestedCategory': document.get('suggested_category'),
-                    'aiTags': json.loads(document.get('ai_tags')) if document.get('ai_tags') else None
+                    'aiTags': json_utils.loads(document.get('ai_tags')) if document.get('ai_tags') else None
                 },
                 'uploadResult': upload_result,
-                'processing': 'started' if needs_processing else 'not_needed'
+                'processing': processing
             }), 201
             
         finally:
@@ -634,6 +649,7 @@ def update_document_category(doc_id):
                 (new_category_id, summary[:2000], doc_id),  # Limit summary to 2000 chars
                 commit=True
             )
+            invalidate_document_context(doc_id)
         else:
             execute_query(
                 "UPDATE documents SET category_id = %s WHERE id = %s",
@@ -694,6 +710,7 @@ def delete_document(doc_id):
             (doc_id,),
             commit=True
         )
+        invalidate_document_context(doc_id)
         
         # Update category count
         execute_query(
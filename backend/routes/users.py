@@ -5,7 +5,7 @@ List users, update profile
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from database import execute_query
-from utils.auth_helper import format_user_response
+from utils.auth_helper import format_user_response, format_user_responses
 
 users_bp = Blueprint('users', __name__)
 
@@ -29,11 +29,9 @@ def get_users():
             fetch_all=True
         )
         
-        formatted_users = []
-        for user in users:
-            user_data = format_user_response(user)
+        formatted_users = format_user_responses(users)
+        for user_data, user in zip(formatted_users, users):
             user_data['documentCount'] = user['document_count']
-            formatted_users.append(user_data)
         
         return jsonify({
             'users': formatted_users
@@ -0,0 +1,270 @@
+"""
+AI Cache - Response caching for Ollama calls
+Exact-match SQLite cache for categorizer/tagger/chatbot prompts, plus an
+in-memory semantic cache for near-duplicate chatbot questions
+"""
+import os
+import hashlib
+import logging
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, List, Optional
+
+import numpy as np
+
+from utils import json_utils
+
+
+logger = logging.getLogger(__name__)
+
+
+class AICache:
+    """On-disk LRU cache of AI responses keyed by (function, model, prompt)"""
+
+    # Evict every N writes instead of counting rows on each insert
+    EVICT_EVERY = 50
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = 5000):
+        """
+        Initialize AI cache
+
+        Args:
+            path: SQLite database file (defaults to AI_CACHE_PATH env var or temp dir)
+            max_entries: Maximum cached responses kept (least recently used are evicted)
+        """
+        self.path = path or os.environ.get(
+            'AI_CACHE_PATH',
+            os.path.join(tempfile.gettempdir(), 'dochub_ai_cache.sqlite3')
+        )
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        self._conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ai_cache (key TEXT PRIMARY KEY, value BLOB, ts INTEGER)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_ai_cache_ts ON ai_cache (ts)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(function: str, model: str, system_prompt: str, user_prompt: str) -> str:
+        """
+        Build cache key for a prompt
+
+        Args:
+            function: Calling function name (namespaces the cache)
+            model: Ollama model name
+            system_prompt: System prompt sent to the model
+            user_prompt: User prompt sent to the model
+
+        Returns:
+            Hex digest key
+        """
+        raw = f"{function}|{model}|{system_prompt}|{user_prompt}".encode('utf-8')
+        return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Get cached value
+
+        Args:
+            key: Cache key from make_key()
+
+        Returns:
+            Cached value or None on miss
+        """
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT value FROM ai_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                # Touch entry so eviction is least-recently-used
+                self._conn.execute(
+                    "UPDATE ai_cache SET ts = ? WHERE key = ?", (int(time.time()), key)
+                )
+                self._conn.commit()
+            return json_utils.loads(row[0])
+        except Exception as e:
+            logger.warning("⚠️ AI cache read failed: %s", e)
+            return None
+
+    def set(self, key: str, value: Any):
+        """
+        Store value in cache
+
+        Args:
+            key: Cache key from make_key()
+            value: JSON-serializable value
+        """
+        try:
+            data = json_utils.dumps(value)
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO ai_cache (key, value, ts) VALUES (?, ?, ?)",
+                    (key, data, int(time.time()))
+                )
+                self._writes += 1
+                if self._writes % self.EVICT_EVERY == 0:
+                    self._conn.execute(
+                        """
+                        DELETE FROM ai_cache WHERE key IN (
+                            SELECT key FROM ai_cache ORDER BY ts DESC LIMIT -1 OFFSET ?
+                        )
+                        """,
+                        (self.max_entries,)
+                    )
+                self._conn.commit()
+        except Exception as e:
+            logger.warning("⚠️ AI cache write failed: %s", e)
+
+
+class SemanticCache:
+    """In-memory cache matching near-duplicate questions by embedding similarity"""
+
+    def __init__(self, threshold: float = 0.95, max_scopes: int = 256, max_per_scope: int = 32):
+        """
+        Initialize semantic cache
+
+        Args:
+            threshold: Minimum cosine similarity for a hit
+            max_scopes: Maximum number of scopes kept (oldest dropped first)
+            max_per_scope: Maximum cached questions per scope
+        """
+        self.threshold = threshold
+        self.max_scopes = max_scopes
+        self.max_per_scope = max_per_scope
+        self._lock = threading.Lock()
+        # scope -> (normalized embedding matrix, list of cached values)
+        self._scopes: "OrderedDict[str, tuple]" = OrderedDict()
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> Optional[np.ndarray]:
+        vec = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else None
+
+    def lookup(self, scope: str, vector: List[float]) -> Optional[Any]:
+        """
+        Find cached value for a similar question
+
+        Args:
+            scope: Context the answer depends on (model, prompt, documents)
+            vector: Question embedding
+
+        Returns:
+            Cached value or None on miss
+        """
+        vec = self._normalize(vector)
+        if vec is None:
+            return None
+
+        with self._lock:
+            entry = self._scopes.get(scope)
+            if entry is None:
+                return None
+            matrix, values = entry
+            if matrix.shape[1] != vec.shape[0]:
+                return None
+
+            similarities = matrix @ vec
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None
+
+            self._scopes.move_to_end(scope)
+            return values[best]
+
+    def add(self, scope: str, vector: List[float], value: Any):
+        """
+        Cache value for a question
+
+        Args:
+            scope: Context the answer depends on (model, prompt, documents)
+            vector: Question embedding
+            value: Value to cache
+        """
+        vec = self._normalize(vector)
+        if vec is None:
+            return
+
+        with self._lock:
+            entry = self._scopes.get(scope)
+            if entry is None or entry[0].shape[1] != vec.shape[0]:
+                matrix, values = vec[np.newaxis, :], [value]
+            else:
+                matrix = np.vstack([entry[0], vec])[-self.max_per_scope:]
+                values = (entry[1] + [value])[-self.max_per_scope:]
+
+            self._scopes[scope] = (matrix, values)
+            self._scopes.move_to_end(scope)
+            while len(self._scopes) > self.max_scopes:
+                self._scopes.popitem(last=False)
+
+
+_ai_cache = None
+_ai_cache_failed = False  # Cache file couldn't be opened - don't retry on every call
+_ai_cache_lock = threading.Lock()
+_semantic_cache = SemanticCache()
+
+
+def is_cache_enabled() -> bool:
+    """Check whether AI response caching is enabled (AI_CACHE_ENABLED env var)"""
+    return os.environ.get('AI_CACHE_ENABLED', 'true').lower() == 'true'
+
+
+def is_chatbot_cache_enabled() -> bool:
+    """
+    Check whether chatbot answers are cached by exact prompt (AI_CHATBOT_CACHE env var)
+    Off by default: entries don't expire, so a cached answer would be served
+    for the same question for as long as it stays in the cache
+    """
+    return is_cache_enabled() and os.environ.get('AI_CHATBOT_CACHE', 'false').lower() == 'true'
+
+
+def is_semantic_cache_enabled() -> bool:
+    """
+    Check whether the chatbot semantic cache is enabled (AI_SEMANTIC_CACHE env var)
+    Off by default: each new question costs an embedding call, which on a
+    single-GPU Ollama server can swap the chat model out of memory
+    """
+    return is_cache_enabled() and os.environ.get('AI_SEMANTIC_CACHE', 'false').lower() == 'true'
+
+
+def get_ai_cache() -> Optional[AICache]:
+    """
+    Get shared AI cache instance
+
+    Returns:
+        AICache, or None if caching is disabled or the cache file can't be opened
+    """
+    global _ai_cache, _ai_cache_failed
+
+    if not is_cache_enabled() or _ai_cache_failed:
+        return None
+
+    if _ai_cache is None:
+        with _ai_cache_lock:
+            if _ai_cache is None and not _ai_cache_failed:
+                try:
+                    _ai_cache = AICache()
+                except Exception as e:
+                    logger.warning("⚠️ AI cache unavailable: %s", e)
+                    _ai_cache_failed = True
+
+    return _ai_cache
+
+
+def get_semantic_cache() -> Optional[SemanticCache]:
+    """
+    Get shared semantic cache instance
+
+    Returns:
+        SemanticCache, or None if semantic caching is disabled
+    """
+    return _semantic_cache if is_semantic_cache_enabled() else None
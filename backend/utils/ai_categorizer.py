@@ -2,10 +2,28 @@
 AI Categorizer - Use Ollama to suggest document categories
 Analyzes document content and suggests the most appropriate category
 """
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 from database import execute_query
 from utils.ollama_helper import OllamaHelper
-import json
+from utils.model_selector import ModelSelector
+from utils.ai_tagger import AITagger
+from utils.ai_cache import AICache, get_ai_cache
+from utils import json_utils
+from utils.text_utils import head_tail
+import difflib
+import logging
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+# How long (seconds) the category list is reused before re-querying the DB
+CATEGORY_CACHE_TTL = 60
+
+# Small-model suggestions below this confidence are re-asked to the large model
+CASCADE_CONFIDENCE_THRESHOLD = 0.6
 
 
 class AICategorizer:
@@ -13,29 +31,163 @@ class AICategorizer:
     
     def __init__(self):
         """Initialize AI categorizer with Ollama"""
-        self.ollama = OllamaHelper()
+        small_model, large_model = ModelSelector.get_cascade_models()
+        self.ollama = OllamaHelper(model=large_model)
+        # Cheap first-pass model (None when the cascade is disabled)
+        self.ollama_small = OllamaHelper(model=small_model) if small_model else None
         
-        # Check connection
-        if not self.ollama.check_connection():
-            print("⚠️ Warning: Ollama connection check failed. Will attempt anyway.")
+        # Cached categories (they change far less often than uploads), replaced
+        # as one tuple so threads sharing this instance never see a mix:
+        # (names, frozenset for exact matches, lowercased name -> name, fetched_at)
+        self._categories: Optional[Tuple[List[str], frozenset, Dict[str, str], float]] = None
+        
+        # Check connection (once per process - OllamaHelper shares one keep-alive
+        # HTTP session, so per-request instances are cheap)
+        self.ollama.probe_once()
     
     def get_existing_categories(self) -> list:
         """
         Get list of existing categories from database
+        Results are cached on the instance for CATEGORY_CACHE_TTL seconds
         
         Returns:
             List of category names
         """
+        now = time.monotonic()
+        cached = self._categories
+        if cached is not None and now - cached[3] < CATEGORY_CACHE_TTL:
+            return cached[0]
+        
         try:
             categories = execute_query(
                 "SELECT id, name, description FROM categories WHERE is_active = TRUE ORDER BY name",
                 (),
                 fetch_all=True
             )
-            return [cat['name'] for cat in categories]
+            names = [cat['name'] for cat in categories]
+            fetched_at = now
         except Exception as e:
-            print(f"⚠️ Error fetching categories: {str(e)}")
-            return ['General']  # Fallback
+            logger.warning("⚠️ Error fetching categories: %s", e)
+            names = ['General']  # Fallback
+            fetched_at = now - CATEGORY_CACHE_TTL  # Already stale - retry the DB on the next call
+        
+        self._categories = (names, frozenset(names), {name.lower(): name for name in names}, fetched_at)
+        return names
+    
+    def _match_category(self, category_name: str, confidence: float) -> Tuple[str, float]:
+        """
+        Resolve an AI-suggested category name to an existing category
+        
+        Args:
+            category_name: Category name returned by the model
+            confidence: Confidence returned by the model
+            
+        Returns:
+            Tuple of (category_name, confidence) - falls back to 'General'
+        """
+        if self._categories is None:
+            self.get_existing_categories()
+        _, cat_set, cat_lower_map, _ = self._categories
+        
+        if category_name in cat_set:
+            return category_name, confidence
+        
+        # Try case-insensitive match
+        category_lower = category_name.lower()
+        matched = cat_lower_map.get(category_lower)
+        
+        if matched:
+            logger.info("⚠️ Category '%s' matched to '%s' (case-insensitive)", category_name, matched)
+            return matched, confidence
+        
+        # Try fuzzy match (e.g., "Enterprice" -> "Enterprise")
+        close = difflib.get_close_matches(
+            category_lower, cat_lower_map.keys(), n=1, cutoff=0.75
+        )
+        
+        if close:
+            matched = cat_lower_map[close[0]]
+            logger.info("⚠️ Category '%s' matched to '%s' (fuzzy match)", category_name, matched)
+            return matched, max(0.3, confidence * 0.8)  # Reduce confidence for fuzzy match
+        
+        logger.warning("⚠️ Suggested category '%s' not found. Using 'General'", category_name)
+        return 'General', 0.3
+    
+    def _request_category(self, ollama: OllamaHelper, system_prompt: str, user_prompt: str) -> Dict:
+        """
+        Ask one model for a category suggestion
+        
+        Args:
+            ollama: Ollama helper (small or large cascade model)
+            system_prompt: Categorization system prompt
+            user_prompt: Prompt with the document preview
+            
+        Returns:
+            Suggestion dict (same format as suggest_category) - 'General' with
+            confidence 0.0 if the request or parsing failed
+        """
+        # Use chat format for better results
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+        
+        # Reuse previous answer for an identical prompt (e.g. re-uploaded document)
+        cache = get_ai_cache()
+        cache_key = AICache.make_key('suggest_category', ollama.model, system_prompt, user_prompt)
+        if cache:
+            cached = cache.get(cache_key)
+            if cached:
+                logger.info("✅ Category suggestion served from cache: %s", cached['suggested_category'])
+                return cached
+        
+        logger.info("🤖 Requesting category suggestion from Ollama (%s)...", ollama.model)
+        # Streamed - stops as soon as the JSON object is complete
+        result = ollama.chat_json(
+            messages=messages,
+            temperature=0.3
+        )
+        
+        if result["error"]:
+            logger.warning("⚠️ Ollama categorization failed: %s", result['error'])
+            return {
+                'suggested_category': 'General',
+                'confidence': 0.0,
+                'reasoning': f'Categorization failed: {result["error"]}'
+            }
+        
+        # Parse JSON response
+        response_text = result["response"]
+        
+        try:
+            parsed_result = json_utils.parse_model_json(response_text, ModelSelector.is_json_reliable(ollama.model))
+            
+            category_name = parsed_result.get('category_name', 'General')
+            confidence = float(parsed_result.get('confidence', 0.5))
+            reasoning = parsed_result.get('reasoning', '')
+            
+            # Validate category exists - try exact match first, then fuzzy match
+            category_name, confidence = self._match_category(category_name, confidence)
+            
+            logger.info("✅ Category suggested: %s (confidence: %.2f)", category_name, confidence)
+            
+            suggestion = {
+                'suggested_category': category_name,
+                'confidence': round(confidence, 2),
+                'reasoning': reasoning
+            }
+            if cache:
+                cache.set(cache_key, suggestion)
+            return suggestion
+            
+        except json_utils.JSONDecodeError as e:
+            logger.warning("⚠️ Failed to parse JSON response: %s", e)
+            logger.debug("Response was: %.200s", response_text)
+            return {
+                'suggested_category': 'General',
+                'confidence': 0.0,
+                'reasoning': f'Failed to parse AI response: {str(e)}'
+            }
     
     def suggest_category(self, document_text: str, document_name: str = "") -> Dict:
         """
@@ -52,33 +204,27 @@ class AICategorizer:
                 - reasoning: Brief explanation
         """
         try:
-            # Get existing categories
-            categories = self.get_existing_categories()
+            # Get existing categories (for the prompt; validation uses the cached set)
+            valid_categories = self.get_existing_categories()
             
-            if not categories:
+            if not valid_categories:
                 return {
                     'suggested_category': 'General',
                     'confidence': 0.0,
                     'reasoning': 'No categories available'
                 }
             
-            categories_str = ", ".join(categories)
+            categories_str = ", ".join(valid_categories)
             
-            # Limit text length for API (keep first 3000 chars to avoid token limits)
-            text_preview = document_text[:3000] if len(document_text) > 3000 else document_text
+            # Limit text length for API (start + end of the document to avoid token limits)
+            text_preview = head_tail(document_text, 2000, 800)
             
             # Create prompt for Ollama
-            system_prompt = """You are a document categorization assistant. 
+            # Static instructions + category list go first (system prompt) so the
+            # server can reuse the cached prompt prefix; only the document varies
+            system_prompt = f"""You are a document categorization assistant. 
 Analyze documents and suggest the most appropriate category from a given list.
-Always respond with valid JSON only, no additional text."""
-
-            user_prompt = f"""Analyze this document and suggest the most appropriate category.
-
-Document Name: {document_name}
-Document Content Preview:
-{text_preview}
-
-Available Categories: {categories_str}
+Always respond with valid JSON only, no additional text.
 
 Analyze the document content and determine which category it best fits into.
 Consider the document's purpose, content type, and subject matter.
@@ -91,15 +237,137 @@ Respond with JSON in this exact format:
 }}
 
 If the document doesn't clearly fit any category, suggest "General" or the closest match.
-Make sure the category_name exactly matches one of the available categories."""
+Make sure the category_name exactly matches one of the available categories.
+
+Available Categories: {categories_str}"""
+
+            user_prompt = f"""Analyze this document and suggest the most appropriate category.
+
+Document Name: {document_name}
+Document Content Preview:
+{text_preview}"""
+
+            if self.ollama_small:
+                suggestion = self._request_category(self.ollama_small, system_prompt, user_prompt)
+                if (suggestion['confidence'] >= CASCADE_CONFIDENCE_THRESHOLD
+                        and suggestion['suggested_category'] != 'General'):
+                    return suggestion
+                logger.info("🔼 Low-confidence suggestion from %s, escalating to %s", self.ollama_small.model, self.ollama.model)
+            
+            return self._request_category(self.ollama, system_prompt, user_prompt)
+                
+        except Exception as e:
+            logger.warning("⚠️ AI categorization error: %s", e)
+            # Fallback: return default
+            return {
+                'suggested_category': 'General',
+                'confidence': 0.0,
+                'reasoning': f'Categorization error: {str(e)}'
+            }
+
+    
+    def _parse_batch_entry(self, entry: Dict, include_tags: bool) -> Dict:
+        """
+        Build a suggestion from one entry of a batch response
+        
+        Args:
+            entry: Result object returned by the model for one document
+            include_tags: Whether to read the entry's tags
+            
+        Returns:
+            Suggestion dict (same shape as suggest_category)
+        """
+        try:
+            confidence = float(entry.get('confidence', 0.5))
+        except (TypeError, ValueError):
+            confidence = 0.5  # Missing or non-numeric confidence (e.g. null)
+        
+        category_name, confidence = self._match_category(
+            str(entry.get('category_name') or 'General'), confidence
+        )
+        suggestion = {
+            'suggested_category': category_name,
+            'confidence': round(confidence, 2),
+            'reasoning': entry.get('reasoning', '')
+        }
+        if include_tags and entry.get('tags'):
+            suggestion['tags'] = AITagger._clean_tags(entry['tags'])
+        return suggestion
+    
+    def suggest_categories_batch(self, docs: List[Tuple[str, str]],
+                                 include_tags: bool = False) -> List[Dict]:
+        """
+        Suggest categories for several documents with a single Ollama call
+        
+        Args:
+            docs: List of (document_text, document_name) tuples
+            include_tags: Also ask for tags in the same call (saves a separate
+                          tagging request per document)
+            
+        Returns:
+            List of suggestion dicts (same format as suggest_category), in input order.
+            With include_tags, suggestions from the batch response also carry
+            'tags' (cleaned tag list); documents the batch didn't cover don't
+        """
+        if not docs:
+            return []
+        if len(docs) == 1:
+            return [self.suggest_category(*docs[0])]
+        
+        try:
+            valid_categories = self.get_existing_categories()
+            
+            if not valid_categories:
+                return [{
+                    'suggested_category': 'General',
+                    'confidence': 0.0,
+                    'reasoning': 'No categories available'
+                } for _ in docs]
+            
+            categories_str = ", ".join(valid_categories)
+            
+            if include_tags:
+                entry_example = '{"idx": 1, "category_name": "CategoryName", "confidence": 0.95, "reasoning": "Brief explanation", "tags": ["tag1", "tag2", "tag3"]}'
+                tags_instructions = """
+Also give each document 3-5 concise, relevant tags (single words or short phrases, lowercase).
+Make tags specific and useful for searching. Avoid generic tags like "document" or "file"."""
+            else:
+                entry_example = '{"idx": 1, "category_name": "CategoryName", "confidence": 0.95, "reasoning": "Brief explanation"}'
+                tags_instructions = ""
+            
+            # Smaller per-document preview so the combined prompt stays bounded
+            documents_str = "\n\n".join(
+                f"[{idx}] Document Name: {name}\nContent Preview:\n{head_tail(text, 1000, 400)}"
+                for idx, (text, name) in enumerate(docs, start=1)
+            )
+            
+            system_prompt = f"""You are a document categorization assistant. 
+Analyze documents and suggest the most appropriate category from a given list.
+Always respond with valid JSON only, no additional text.
+
+Respond with JSON in this exact format, one entry per document:
+{{
+    "results": [
+        {entry_example}
+    ]
+}}
+
+If a document doesn't clearly fit any category, suggest "General" or the closest match.
+Make sure each category_name exactly matches one of the available categories.{tags_instructions}
+
+Available Categories: {categories_str}"""
+
+            user_prompt = f"""Analyze each of the following documents and suggest the most appropriate category for each.
+
+Documents:
+{documents_str}"""
 
-            # Use chat format for better results
             messages = [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
             ]
             
-            print(f"🤖 Requesting category suggestion from Ollama...")
+            logger.info("🤖 Requesting batch category suggestions for %d documents...", len(docs))
             result = self.ollama.chat(
                 messages=messages,
                 temperature=0.3,
@@ -107,84 +375,60 @@ Make sure the category_name exactly matches one of the available categories."""
             )
             
             if result["error"]:
-                print(f"⚠️ Ollama categorization failed: {result['error']}")
-                return {
-                    'suggested_category': 'General',
-                    'confidence': 0.0,
-                    'reasoning': f'Categorization failed: {result["error"]}'
-                }
+                raise ValueError(result["error"])
             
-            # Parse JSON response
-            response_text = result["response"]
+            parsed = json_utils.parse_model_json(result["response"], ModelSelector.is_json_reliable(self.ollama.model))
+            entries = parsed.get('results', []) if isinstance(parsed, dict) else parsed
             
-            # Clean JSON if wrapped in markdown
-            if "```json" in response_text:
-                response_text = response_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in response_text:
-                response_text = response_text.split("```")[1].split("```")[0].strip()
+            by_idx = {}
+            for entry in entries:
+                if not isinstance(entry, dict):
+                    continue
+                try:
+                    by_idx[int(entry.get('idx'))] = entry
+                except (TypeError, ValueError):
+                    continue
             
-            try:
-                parsed_result = json.loads(response_text)
-                
-                category_name = parsed_result.get('category_name', 'General')
-                confidence = float(parsed_result.get('confidence', 0.5))
-                reasoning = parsed_result.get('reasoning', '')
-                
-                # Validate category exists - try exact match first, then fuzzy match
-                valid_categories = self.get_existing_categories()
-                
-                if category_name not in valid_categories:
-                    # Try case-insensitive match
-                    category_lower = category_name.lower()
-                    matched = None
-                    for valid_cat in valid_categories:
-                        if valid_cat.lower() == category_lower:
-                            matched = valid_cat
-                            break
-                    
-                    if matched:
-                        print(f"⚠️ Category '{category_name}' matched to '{matched}' (case-insensitive)")
-                        category_name = matched
-                    else:
-                        # Try partial/fuzzy match (e.g., "Enterprice" -> "Enterprise")
-                        for valid_cat in valid_categories:
-                            if category_lower in valid_cat.lower() or valid_cat.lower() in category_lower:
-                                if len(valid_cat) >= len(category_name) * 0.7:  # At least 70% length match
-                                    matched = valid_cat
-                                    print(f"⚠️ Category '{category_name}' matched to '{matched}' (fuzzy match)")
-                                    break
-                        
-                        if matched:
-                            category_name = matched
-                            confidence = max(0.3, confidence * 0.8)  # Reduce confidence for fuzzy match
-                        else:
-                            print(f"⚠️ Suggested category '{category_name}' not found. Using 'General'")
-                            category_name = 'General'
-                            confidence = 0.3
-                
-                print(f"✅ Category suggested: {category_name} (confidence: {confidence:.2f})")
-                
-                return {
-                    'suggested_category': category_name,
-                    'confidence': round(confidence, 2),
-                    'reasoning': reasoning
-                }
-                
-            except json.JSONDecodeError as e:
-                print(f"⚠️ Failed to parse JSON response: {str(e)}")
-                print(f"Response was: {response_text[:200]}")
-                return {
-                    'suggested_category': 'General',
-                    'confidence': 0.0,
-                    'reasoning': f'Failed to parse AI response: {str(e)}'
-                }
+            suggestions = []
+            for idx, doc in enumerate(docs, start=1):
+                entry = by_idx.get(idx)
+                if entry is None:
+                    # Model skipped this document - categorize it on its own
+                    suggestions.append(self.suggest_category(*doc))
+                    continue
                 
+                try:
+                    suggestion = self._parse_batch_entry(entry, include_tags)
+                except Exception as entry_error:
+                    # Malformed entry - categorize just this document on its own
+                    logger.warning("⚠️ Malformed batch entry %d: %s", idx, entry_error)
+                    suggestion = self.suggest_category(*doc)
+                suggestions.append(suggestion)
+            
+            logger.info("✅ Batch categorized %d documents", len(suggestions))
+            return suggestions
+            
         except Exception as e:
-            print(f"⚠️ AI categorization error: {str(e)}")
-            # Fallback: return default
-            return {
-                'suggested_category': 'General',
-                'confidence': 0.0,
-                'reasoning': f'Categorization error: {str(e)}'
-            }
+            logger.warning("⚠️ Batch categorization failed, falling back to single requests: %s", e)
+            return [self.suggest_category(text, name) for text, name in docs]
+
+
+_ai_categorizer = None
+_ai_categorizer_lock = threading.Lock()
 
+
+def get_ai_categorizer() -> AICategorizer:
+    """
+    Get shared AI categorizer instance (created once per process, on first use)
+    
+    Returns:
+        AICategorizer
+    """
+    global _ai_categorizer
+    
+    if _ai_categorizer is None:
+        with _ai_categorizer_lock:
+            if _ai_categorizer is None:
+                _ai_categorizer = AICategorizer()
+    
+    return _ai_categorizer
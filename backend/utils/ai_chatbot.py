@@ -3,12 +3,104 @@ AI Chatbot - Document Assistant using Ollama
 Handles RAG (Retrieval Augmented Generation) for document Q&A
 Uses smart model selection based on query complexity
 """
-from typing import Dict, Optional, List
+from typing import Dict, Iterator, Optional, List, Tuple
 from database import execute_query
 from utils.ollama_helper import OllamaHelper
 from utils.model_selector import ModelSelector
+from utils.ai_cache import AICache, get_ai_cache, get_semantic_cache, is_chatbot_cache_enabled
+from utils.text_utils import TRUNCATION_MARKER
 from flask import current_app
+from concurrent.futures import ThreadPoolExecutor
 import json
+import logging
+import os
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+# Shared by every chatbot request (kept constant for prompt-prefix caching)
+CHATBOT_SYSTEM_PROMPT = """You are a helpful document assistant. Your job is to answer questions about documents accurately and concisely, and to help with general questions when no documents are relevant.
+
+Guidelines:
+- Answer based on the provided document content when available
+- If the answer is not in the documents, say so clearly
+- If you don't know something, say so
+- Be concise but comprehensive
+- Cite document names when referencing multiple documents
+- Use clear, professional language"""
+
+
+# Background work that overlaps with request handling (Ollama HTTP calls only -
+# worker threads have no Flask app context, so no database access here)
+_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix='chatbot')
+
+# Config values read once per process (see _get_cfg)
+_config_cache: Dict[str, object] = {}
+
+
+def _get_cfg(key: str, default=None):
+    """
+    Get a config value, reading Flask config (or the environment outside an
+    app context) only on first access
+    
+    Args:
+        key: Config key / environment variable name
+        default: Value used when the key is not set
+        
+    Returns:
+        Config value
+    """
+    if key in _config_cache:
+        return _config_cache[key]
+    
+    try:
+        value = current_app.config.get(key, default)
+    except RuntimeError:
+        # Outside Flask context
+        value = os.environ.get(key, default)
+    
+    _config_cache[key] = value
+    return value
+
+
+# Document context reused across follow-up questions about the same document
+# document_id -> (fetched_at, max_chars, context)
+DOC_CONTEXT_TTL = 120
+DOC_CONTEXT_MAX_ENTRIES = 256
+_doc_context_cache: Dict[int, Tuple[float, int, Dict]] = {}
+
+# Seconds a semantic cache lookup waits for the question embedding
+SEMANTIC_EMBED_TIMEOUT = 3
+
+# Question embeddings for semantic cache lookups: (base_url, question) -> vector
+QUESTION_VECTOR_MAX_ENTRIES = 512
+_question_vectors: Dict[Tuple[str, str], tuple] = {}
+
+
+def invalidate_document_context(document_id: int):
+    """Drop cached chatbot context for a document (call after its text/summary changes)"""
+    _doc_context_cache.pop(document_id, None)
+
+
+def _embed_question(base_url: str, question: str) -> Optional[tuple]:
+    """Embed a chatbot question (memoized per question for semantic cache lookups)"""
+    key = (base_url, question)
+    vector = _question_vectors.get(key)
+    if vector is not None:
+        return vector
+    
+    # Short timeout: the lookup runs before generation, so a slow or missing
+    # embedding model must not hold up the answer
+    vector = OllamaHelper(base_url=base_url).embed(question, timeout=SEMANTIC_EMBED_TIMEOUT)
+    if not vector:
+        return None  # Not memoized - a transient failure shouldn't disable lookups for this question
+    
+    if len(_question_vectors) >= QUESTION_VECTOR_MAX_ENTRIES:
+        _question_vectors.clear()
+    _question_vectors[key] = tuple(vector)
+    return _question_vectors[key]
 
 
 class AIChatbot:
@@ -22,23 +114,23 @@ class AIChatbot:
             model: Specific model to use (if None, will use smart selection)
         """
         self.ollama = OllamaHelper(model=model)
-        self.use_smart_selection = True
         
         # Check if smart model selection is enabled
-        try:
-            self.use_smart_selection = current_app.config.get('USE_SMART_MODEL_SELECTION', True)
-        except RuntimeError:
-            # Outside Flask context
-            import os
-            self.use_smart_selection = os.environ.get('USE_SMART_MODEL_SELECTION', 'true').lower() == 'true'
+        use_smart_selection = _get_cfg('USE_SMART_MODEL_SELECTION', True)
+        if isinstance(use_smart_selection, str):
+            # Outside Flask context the value comes from the environment
+            use_smart_selection = use_smart_selection.lower() == 'true'
+        self.use_smart_selection = use_smart_selection
+        self._base_url = _get_cfg('OLLAMA_BASE_URL', 'http://localhost:11434')
         
-        # Check connection
-        if not self.ollama.check_connection():
-            print("⚠️ Warning: Ollama connection check failed. Will attempt anyway.")
+        # Check connection (once per process - OllamaHelper shares one keep-alive
+        # HTTP session, so per-request instances are cheap)
+        self.ollama.probe_once()
     
     def get_document_context(self, document_id: int, max_chars: int = 4000) -> Dict:
         """
         Retrieve document text for context
+        Cached per document for DOC_CONTEXT_TTL seconds (see invalidate_document_context)
         
         Args:
             document_id: Document ID to retrieve
@@ -47,14 +139,30 @@ class AIChatbot:
         Returns:
             Dict with document info and text
         """
+        cached = _doc_context_cache.get(document_id)
+        if cached:
+            fetched_at, cached_max_chars, context = cached
+            if cached_max_chars == max_chars and time.monotonic() - fetched_at < DOC_CONTEXT_TTL:
+                return dict(context)
+        
         try:
+            # Keep the start and end of long documents (70/30 split). Both ends are
+            # cut in SQL so large extracted_text values are not shipped in full;
+            # the head covers the whole text whenever it fits in max_chars.
+            head_len = int(max_chars * 0.7)
+            tail_len = max_chars - head_len
+            prefix_len = max_chars + len(TRUNCATION_MARKER)
             document = execute_query(
                 """
-                SELECT id, name, extracted_text, summary
+                SELECT id, name,
+                       SUBSTRING(extracted_text, 1, %s) AS text_head,
+                       RIGHT(extracted_text, %s) AS text_tail,
+                       CHAR_LENGTH(extracted_text) AS extracted_length,
+                       SUBSTRING(summary, 1, %s) AS summary
                 FROM documents
                 WHERE id = %s
                 """,
-                (document_id,),
+                (prefix_len, tail_len, max_chars, document_id),
                 fetch_one=True
             )
             
@@ -62,11 +170,16 @@ class AIChatbot:
                 return {'error': 'Document not found'}
             
             # Use extracted_text, fallback to summary, fallback to empty
-            text = document.get('extracted_text') or document.get('summary') or ''
+            text = document.get('text_head') or ''
+            if text.strip():
+                if (document.get('extracted_length') or 0) > len(text):
+                    text = text[:head_len] + TRUNCATION_MARKER + document['text_tail']
+            else:
+                text = document.get('summary') or ''
             
             # Check if we actually have text content
             if not text or not text.strip():
-                print(f"⚠️ Document {document_id} has no extracted text or summary")
+                logger.warning("⚠️ Document %s has no extracted text or summary", document_id)
                 return {
                     'error': 'Document has no extractable text content. Please ensure the document has been processed and has extracted_text or summary.',
                     'document_id': document['id'],
@@ -75,26 +188,31 @@ class AIChatbot:
                     'text_length': 0
                 }
             
-            # Truncate if too long (keep first max_chars chars)
-            if len(text) > max_chars:
-                text = text[:max_chars] + "...\n[Text truncated due to length]"
-            
-            print(f"✅ Retrieved document context: {document['name']} ({len(text)} chars)")
+            logger.info("✅ Retrieved document context: %s (%d chars)", document['name'], len(text))
             
-            return {
+            context = {
                 'document_id': document['id'],
                 'document_name': document['name'],
                 'text': text,
                 'text_length': len(text)
             }
+            
+            # Only successful lookups are cached - a document without text may
+            # still be processing
+            if len(_doc_context_cache) >= DOC_CONTEXT_MAX_ENTRIES:
+                _doc_context_cache.clear()
+            _doc_context_cache[document_id] = (time.monotonic(), max_chars, context)
+            
+            return dict(context)
         except Exception as e:
-            print(f"⚠️ Error fetching document context: {str(e)}")
+            logger.warning("⚠️ Error fetching document context: %s", e)
             return {'error': f'Failed to fetch document: {str(e)}'}
     
     def search_user_documents(self, query: str, user_id: int, limit: int = 3) -> List[Dict]:
         """
         Search across user's documents for relevant context
-        (Simplified search - can be enhanced with embeddings later)
+        Uses the MySQL FULLTEXT index, ranked by relevance
+        (falls back to LIKE matching if the index is missing)
         
         Args:
             query: Search query
@@ -105,21 +223,45 @@ class AIChatbot:
             List of document dicts
         """
         try:
-            # Simple keyword search in extracted_text and summary
-            search_term = f"%{query}%"
-            documents = execute_query(
-                """
-                SELECT id, name, extracted_text, summary
-                FROM documents
-                WHERE uploaded_by = %s
-                AND (extracted_text LIKE %s OR summary LIKE %s OR name LIKE %s)
-                AND extracted_text IS NOT NULL
-                AND extracted_text != ''
-                LIMIT %s
-                """,
-                (user_id, search_term, search_term, search_term, limit),
-                fetch_all=True
-            )
+            try:
+                # Full-text search via the idx_fulltext_search index (database_schema.sql).
+                # MATCH() must list exactly the indexed columns.
+                documents = execute_query(
+                    """
+                    SELECT id, name,
+                           SUBSTRING(extracted_text, 1, 1600) AS extracted_text,
+                           SUBSTRING(summary, 1, 1600) AS summary,
+                           MATCH(name, summary, extracted_text, title, subject) AGAINST (%s) AS relevance
+                    FROM documents
+                    WHERE uploaded_by = %s
+                    AND MATCH(name, summary, extracted_text, title, subject) AGAINST (%s)
+                    AND extracted_text IS NOT NULL
+                    AND extracted_text != ''
+                    ORDER BY relevance DESC
+                    LIMIT %s
+                    """,
+                    (query, user_id, query, limit),
+                    fetch_all=True
+                )
+            except Exception as fulltext_error:
+                # FULLTEXT index missing on this database - fall back to keyword scan
+                logger.warning("⚠️ Full-text search unavailable, using LIKE search: %s", fulltext_error)
+                search_term = f"%{query}%"
+                documents = execute_query(
+                    """
+                    SELECT id, name,
+                           SUBSTRING(extracted_text, 1, 1600) AS extracted_text,
+                           SUBSTRING(summary, 1, 1600) AS summary
+                    FROM documents
+                    WHERE uploaded_by = %s
+                    AND (extracted_text LIKE %s OR summary LIKE %s OR name LIKE %s)
+                    AND extracted_text IS NOT NULL
+                    AND extracted_text != ''
+                    LIMIT %s
+                    """,
+                    (user_id, search_term, search_term, search_term, limit),
+                    fetch_all=True
+                )
             
             results = []
             for doc in documents:
@@ -135,18 +277,18 @@ class AIChatbot:
             
             return results
         except Exception as e:
-            print(f"⚠️ Error searching documents: {str(e)}")
+            logger.warning("⚠️ Error searching documents: %s", e)
             return []
     
-    def generate_response(
-        self, 
-        question: str, 
+    def _prepare_request(
+        self,
+        question: str,
         document_context: Optional[Dict] = None,
         chat_history: Optional[List[Dict]] = None,
         user_id: Optional[int] = None
-    ) -> Dict:
+    ) -> Tuple[Optional[Dict], Optional[Dict]]:
         """
-        Generate AI response using RAG
+        Build prompts, gather document context and select model for a question
         
         Args:
             question: User's question
@@ -155,180 +297,253 @@ class AIChatbot:
             user_id: User ID (for multi-document search if no document_context)
             
         Returns:
-            Dict with response and metadata
+            Tuple of (request, early_response). early_response is set (and request
+            is None) when the question can be answered without calling Ollama.
         """
-        try:
-            # Build context
-            context_text = ""
-            sources = []
-            
-            if document_context:
-                # Single document query
-                if 'error' in document_context:
-                    error_msg = document_context['error']
-                    print(f"⚠️ Document context error: {error_msg}")
-                    
-                    # If it's an empty text error, still try to answer but inform user
-                    if 'no extractable text' in error_msg.lower() or 'no extracted text' in error_msg.lower():
-                        return {
-                            'response': f"I see you've selected the document '{document_context.get('document_name', 'this document')}', but it doesn't have any extractable text content yet. The document may still be processing, or it might be a scanned image that needs OCR. Please try:\n\n1. Wait a moment if the document is still processing\n2. Check if OCR processing is needed for this document\n3. Or select a different document that has been fully processed.",
-                            'sources': [{
-                                'document_id': document_context.get('document_id'),
-                                'document_name': document_context.get('document_name', 'Unknown')
-                            }],
-                            'error': error_msg
-                        }
-                    
-                    return {
-                        'response': f"I encountered an issue with the selected document: {error_msg}. Please try selecting a different document or contact support if the problem persists.",
-                        'sources': [],
-                        'error': error_msg
-                    }
+        # Fetch the Ollama model list in the background while documents are
+        # searched - model selection needs both. The DB search stays on this
+        # thread because it needs the Flask app context (g.db).
+        models_future = None
+        if self.use_smart_selection:
+            models_future = _EXECUTOR.submit(ModelSelector.get_available_models, self._base_url)
+        
+        # Build context
+        context_text = ""
+        sources = []
+        
+        if document_context:
+            # Single document query
+            if 'error' in document_context:
+                error_msg = document_context['error']
+                logger.warning("⚠️ Document context error: %s", error_msg)
                 
-                # Check if document has actual text content
-                if not document_context.get('text') or not document_context['text'].strip():
-                    print(f"⚠️ Document {document_context.get('document_id')} has empty text")
-                    return {
-                        'response': f"The document '{document_context.get('document_name', 'selected document')}' doesn't have any text content available yet. It may still be processing, or it might need OCR extraction. Please wait a moment and try again, or select a different document.",
+                # If it's an empty text error, still try to answer but inform user
+                if 'no extractable text' in error_msg.lower() or 'no extracted text' in error_msg.lower():
+                    return None, {
+                        'response': f"I see you've selected the document '{document_context.get('document_name', 'this document')}', but it doesn't have any extractable text content yet. The document may still be processing, or it might be a scanned image that needs OCR. Please try:\n\n1. Wait a moment if the document is still processing\n2. Check if OCR processing is needed for this document\n3. Or select a different document that has been fully processed.",
                         'sources': [{
-                            'document_id': document_context['document_id'],
-                            'document_name': document_context['document_name']
+                            'document_id': document_context.get('document_id'),
+                            'document_name': document_context.get('document_name', 'Unknown')
                         }],
-                        'error': 'Empty document text'
+                        'error': error_msg
                     }
                 
-                context_text = f"""
+                return None, {
+                    'response': f"I encountered an issue with the selected document: {error_msg}. Please try selecting a different document or contact support if the problem persists.",
+                    'sources': [],
+                    'error': error_msg
+                }
+            
+            # Check if document has actual text content
+            if not document_context.get('text') or not document_context['text'].strip():
+                logger.warning("⚠️ Document %s has empty text", document_context.get('document_id'))
+                return None, {
+                    'response': f"The document '{document_context.get('document_name', 'selected document')}' doesn't have any text content available yet. It may still be processing, or it might need OCR extraction. Please wait a moment and try again, or select a different document.",
+                    'sources': [{
+                        'document_id': document_context['document_id'],
+                        'document_name': document_context['document_name']
+                    }],
+                    'error': 'Empty document text'
+                }
+            
+            context_text = f"""
 Document: {document_context['document_name']}
 Document ID: {document_context['document_id']}
 
 Document Content:
 {document_context['text']}
 """
-                sources.append({
-                    'document_id': document_context['document_id'],
-                    'document_name': document_context['document_name']
-                })
-                
-                print(f"✅ Using document context from: {document_context['document_name']}")
-            elif user_id:
-                # Multi-document search (search across user's documents)
-                relevant_docs = self.search_user_documents(question, user_id, limit=3)
-                if relevant_docs:
-                    context_text = "Relevant Documents:\n\n"
-                    for doc in relevant_docs:
-                        context_text += f"Document: {doc['document_name']} (ID: {doc['document_id']})\n"
-                        context_text += f"Content: {doc['text']}\n\n"
-                        sources.append({
-                            'document_id': doc['document_id'],
-                            'document_name': doc['document_name']
-                        })
-                else:
-                    # No relevant documents found - still answer the question as a general assistant
-                    context_text = "Note: No relevant documents were found in your library matching this query."
-            else:
-                # No user_id provided - general query without document search
-                context_text = "Note: This is a general question not tied to any specific document."
-            
-            # Build chat history context (last 3 exchanges)
-            history_context = ""
-            if chat_history:
-                recent_history = chat_history[-6:]  # Last 3 exchanges (6 messages)
-                history_context = "\n\nPrevious conversation:\n"
-                for msg in recent_history:
-                    role = msg.get('role', 'user')
-                    content = msg.get('content', '')
-                    history_context += f"{role.capitalize()}: {content}\n"
-            
-            # Determine if we have document context
-            has_document_context = bool(document_context and 'error' not in document_context) or bool(sources)
-            
-            # Create system prompt - adapt based on whether we have document context
-            if has_document_context:
-                # We have document context
-                system_prompt = """You are a helpful document assistant. Your job is to answer questions about documents accurately and concisely.
-
-Guidelines:
-- Answer based on the provided document content when available
-- If the answer is not in the documents, say so clearly
-- Be concise but comprehensive
-- Cite document names when referencing multiple documents
-- Use clear, professional language"""
-                
-                # Create user prompt with document context
-                user_prompt = f"""{context_text}{history_context}
-
-User Question: {question}
-
-Please provide a clear, accurate answer based on the document content above. If the information is not available in the documents, please state that clearly."""
+            sources.append({
+                'document_id': document_context['document_id'],
+                'document_name': document_context['document_name']
+            })
+            
+            logger.info("✅ Using document context from: %s", document_context['document_name'])
+        elif user_id:
+            # Multi-document search (search across user's documents)
+            relevant_docs = self.search_user_documents(question, user_id, limit=3)
+            if relevant_docs:
+                context_text = "Relevant Documents:\n\n"
+                for doc in relevant_docs:
+                    context_text += f"Document: {doc['document_name']} (ID: {doc['document_id']})\n"
+                    context_text += f"Content: {doc['text']}\n\n"
+                    sources.append({
+                        'document_id': doc['document_id'],
+                        'document_name': doc['document_name']
+                    })
             else:
-                # No document context - act as general assistant
-                system_prompt = """You are a helpful AI assistant. Answer the user's question clearly and concisely.
-
-Guidelines:
-- Be helpful, accurate, and concise
-- If you don't know something, say so
-- Use clear, professional language
-- If the question is about documents, you can suggest that the user select a specific document from their library or rephrase their question"""
-                
-                # Create user prompt for general question
-                user_prompt = f"""{context_text}{history_context}
+                # No relevant documents found - still answer the question as a general assistant
+                context_text = "Note: No relevant documents were found in your library matching this query."
+        else:
+            # No user_id provided - general query without document search
+            context_text = "Note: This is a general question not tied to any specific document."
+        
+        # Build chat history context (last 3 exchanges)
+        history_context = ""
+        if chat_history:
+            recent_history = list(chat_history)[-6:]  # Last 3 exchanges (6 messages)
+            history_context = "\n\nPrevious conversation:\n" + "\n".join(
+                f"{msg.get('role', 'user').capitalize()}: {msg.get('content', '')}"
+                for msg in recent_history
+            )
+        
+        # Determine if we have document context
+        has_document_context = bool(document_context and 'error' not in document_context) or bool(sources)
+        
+        # System prompt is a constant so Ollama can reuse its cached KV prefix on
+        # every turn; everything that varies goes in the user prompt, in the order
+        # context -> history -> question
+        system_prompt = CHATBOT_SYSTEM_PROMPT
+        
+        if has_document_context:
+            instruction = "Please provide a clear, accurate answer based on the document content above. If the information is not available in the documents, please state that clearly."
+        else:
+            instruction = "Please provide a helpful answer to the user's question. If the question is about documents, you can suggest that the user select a specific document from their library or rephrase their question."
+        
+        user_prompt = f"""{context_text}{history_context}
 
 User Question: {question}
 
-Please provide a helpful answer to the user's question."""
+{instruction}"""
+        
+        # Smart model selection based on query complexity
+        model_config = None
+        if self.use_smart_selection:
+            context_length = len(context_text) if context_text else 0
+            has_multiple_docs = len(sources) > 1
+            
+            # Select model with availability check (model list prefetched above)
+            available_models = models_future.result()
+            model_config = ModelSelector.select_model(
+                question=question,
+                document_context_length=context_length,
+                has_multiple_documents=has_multiple_docs,
+                available_models=available_models if available_models else None
+            )
             
-            # Call Ollama
-            messages = [
+            # Update Ollama helper with selected model
+            if model_config['model'] != self.ollama.model:
+                logger.info("🔄 Switching model: %s → %s (%s tier)", self.ollama.model, model_config['model'], model_config['tier'])
+                self.ollama.set_model(model_config['model'])
+            
+            temperature = model_config['temperature']
+            logger.info("🤖 Using %s tier model: %s", model_config['tier'], model_config['model'])
+        else:
+            temperature = 0.3
+            logger.info("🤖 Using default model: %s", self.ollama.model)
+        
+        logger.debug("📝 Question: %.100s...", question)
+        logger.debug("📄 Has document context: %s", has_document_context)
+        logger.debug("🔗 Sources count: %d", len(sources))
+        logger.debug("🌡️ Temperature: %s", temperature)
+        
+        return {
+            'messages': [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
-            ]
+            ],
+            'system_prompt': system_prompt,
+            'user_prompt': user_prompt,
+            'context_text': context_text,
+            'sources': sources,
+            'temperature': temperature
+        }, None
+    
+    def _lookup_cache(self, request: Dict, question: str, chat_history: Optional[List[Dict]]) -> Optional[str]:
+        """
+        Look up a cached answer for a prepared request
+        Stores the cache keys on the request so _store_cache() can reuse them
+        
+        Args:
+            request: Request from _prepare_request()
+            question: User's question
+            chat_history: Previous messages in conversation
             
-            # Smart model selection based on query complexity
-            model_config = None
-            if self.use_smart_selection:
-                context_length = len(context_text) if context_text else 0
-                has_multiple_docs = len(sources) > 1
-                
-                # Get base URL for availability check
-                base_url = None
-                try:
-                    base_url = current_app.config.get('OLLAMA_BASE_URL')
-                except RuntimeError:
-                    import os
-                    base_url = os.environ.get('OLLAMA_BASE_URL', 'http://localhost:11434')
-                
-                # Select model with availability check
-                model_config = ModelSelector.select_model_with_availability_check(
-                    question=question,
-                    document_context_length=context_length,
-                    has_multiple_documents=has_multiple_docs,
-                    base_url=base_url
+        Returns:
+            Cached response text or None on miss
+        """
+        # Exact-match cache: identical prompt (including history) reuses the previous answer
+        cache = get_ai_cache() if is_chatbot_cache_enabled() else None
+        if cache:
+            request['cache_key'] = AICache.make_key(
+                'generate_response', self.ollama.model, request['system_prompt'], request['user_prompt']
+            )
+            cached_response = cache.get(request['cache_key'])
+            if cached_response:
+                logger.info("✅ Chatbot response served from cache")
+                return cached_response
+        
+        # Semantic cache: near-duplicate questions about the same context.
+        # Only for the first question of a conversation - follow-ups depend on history.
+        semantic_cache = get_semantic_cache() if not chat_history else None
+        if semantic_cache:
+            question_vector = _embed_question(self.ollama.base_url, question)
+            if question_vector:
+                request['question_vector'] = question_vector
+                request['semantic_scope'] = AICache.make_key(
+                    'generate_response', self.ollama.model, request['system_prompt'], request['context_text']
                 )
-                
-                # Update Ollama helper with selected model
-                if model_config['model'] != self.ollama.model:
-                    print(f"🔄 Switching model: {self.ollama.model} → {model_config['model']} ({model_config['tier']} tier)")
-                    self.ollama.set_model(model_config['model'])
-                
-                temperature = model_config['temperature']
-                print(f"🤖 Using {model_config['tier']} tier model: {model_config['model']}")
-            else:
-                temperature = 0.3
-                print(f"🤖 Using default model: {self.ollama.model}")
+                cached_response = semantic_cache.lookup(request['semantic_scope'], question_vector)
+                if cached_response:
+                    logger.info("✅ Chatbot response served from semantic cache")
+                    return cached_response
+        
+        return None
+    
+    def _store_cache(self, request: Dict, response_text: str):
+        """
+        Cache a generated answer for a prepared request
+        
+        Args:
+            request: Request passed to _lookup_cache()
+            response_text: Generated response
+        """
+        cache = get_ai_cache() if is_chatbot_cache_enabled() else None
+        if cache and request.get('cache_key'):
+            cache.set(request['cache_key'], response_text)
+        
+        semantic_cache = get_semantic_cache()
+        if semantic_cache and request.get('semantic_scope'):
+            semantic_cache.add(request['semantic_scope'], request['question_vector'], response_text)
+    
+    def generate_response(
+        self, 
+        question: str, 
+        document_context: Optional[Dict] = None,
+        chat_history: Optional[List[Dict]] = None,
+        user_id: Optional[int] = None
+    ) -> Dict:
+        """
+        Generate AI response using RAG
+        
+        Args:
+            question: User's question
+            document_context: Single document context (if querying specific document)
+            chat_history: Previous messages in conversation (for context)
+            user_id: User ID (for multi-document search if no document_context)
+            
+        Returns:
+            Dict with response and metadata
+        """
+        try:
+            request, early_response = self._prepare_request(question, document_context, chat_history, user_id)
+            if early_response:
+                return early_response
             
-            print(f"📝 Question: {question[:100]}...")
-            print(f"📄 Has document context: {has_document_context}")
-            print(f"🔗 Sources count: {len(sources)}")
-            print(f"🌡️ Temperature: {temperature}")
+            sources = request['sources']
+            
+            cached_response = self._lookup_cache(request, question, chat_history)
+            if cached_response:
+                return {'response': cached_response, 'sources': sources, 'error': None}
             
             result = self.ollama.chat(
-                messages=messages,
-                temperature=temperature,
+                messages=request['messages'],
+                temperature=request['temperature'],
                 format=None
             )
             
             if result["error"]:
-                print(f"⚠️ Ollama chatbot request failed: {result['error']}")
+                logger.warning("⚠️ Ollama chatbot request failed: %s", result['error'])
                 return {
                     'response': f"I apologize, but I'm having trouble processing your request. Please try again. Error: {result['error']}",
                     'sources': sources,
@@ -338,15 +553,17 @@ Please provide a helpful answer to the user's question."""
             response_text = result.get("response", "").strip()
             
             if not response_text:
-                print(f"⚠️ Empty response from Ollama")
+                logger.warning("⚠️ Empty response from Ollama")
                 return {
                     'response': "I apologize, but I didn't receive a response. Please try asking your question again, or check if Ollama is running properly.",
                     'sources': sources,
                     'error': 'Empty response from Ollama'
                 }
             
-            print(f"✅ Received chatbot response ({len(response_text)} chars)")
-            print(f"📤 Response preview: {response_text[:100]}...")
+            logger.info("✅ Received chatbot response (%d chars)", len(response_text))
+            logger.debug("📤 Response preview: %.100s...", response_text)
+            
+            self._store_cache(request, response_text)
             
             return {
                 'response': response_text,
@@ -355,10 +572,74 @@ Please provide a helpful answer to the user's question."""
             }
             
         except Exception as e:
-            print(f"⚠️ AI chatbot error: {str(e)}")
+            logger.warning("⚠️ AI chatbot error: %s", e)
             return {
                 'response': f"I encountered an error while processing your question. Please try again.",
                 'sources': [],
                 'error': str(e)
             }
-
+    
+    def stream_response(
+        self,
+        question: str,
+        document_context: Optional[Dict] = None,
+        chat_history: Optional[List[Dict]] = None,
+        user_id: Optional[int] = None
+    ) -> Iterator[Dict]:
+        """
+        Generate AI response using RAG, streaming tokens as they are produced
+        
+        Args:
+            question: User's question
+            document_context: Single document context (if querying specific document)
+            chat_history: Previous messages in conversation (for context)
+            user_id: User ID (for multi-document search if no document_context)
+            
+        Yields:
+            Event dicts:
+                - {'type': 'start', 'sources': [...]}
+                - {'type': 'chunk', 'content': '...'}
+                - {'type': 'done', 'response': '...', 'sources': [...], 'error': None}
+                - {'type': 'error', 'error': '...'}
+        """
+        try:
+            request, early_response = self._prepare_request(question, document_context, chat_history, user_id)
+            if early_response:
+                yield {'type': 'start', 'sources': early_response['sources']}
+                yield {'type': 'chunk', 'content': early_response['response']}
+                yield {'type': 'done', **early_response}
+                return
+            
+            sources = request['sources']
+            yield {'type': 'start', 'sources': sources}
+            
+            cached_response = self._lookup_cache(request, question, chat_history)
+            if cached_response:
+                yield {'type': 'chunk', 'content': cached_response}
+                yield {'type': 'done', 'response': cached_response, 'sources': sources, 'error': None}
+                return
+            
+            parts = []
+            for chunk in self.ollama.chat_stream(request['messages'], temperature=request['temperature']):
+                if chunk.get('error'):
+                    yield {'type': 'error', 'error': chunk['error']}
+                    return
+                
+                content = chunk.get('content', '')
+                if content:
+                    parts.append(content)
+                    yield {'type': 'chunk', 'content': content}
+                
+                if chunk.get('done'):
+                    break
+            
+            response_text = "".join(parts)
+            logger.info("✅ Streamed chatbot response (%d chars)", len(response_text))
+            if response_text.strip():
+                self._store_cache(request, response_text)
+            
+            yield {'type': 'done', 'response': response_text, 'sources': sources, 'error': None}
+            
+        except Exception as e:
+            logger.warning("⚠️ AI chatbot streaming error: %s", e)
+            yield {'type': 'error', 'error': str(e)}
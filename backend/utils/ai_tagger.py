@@ -2,9 +2,28 @@
 AI Tag Generator - Generate relevant tags from document content using Ollama
 Extracts key topics, themes, and entities to create searchable tags
 """
-from typing import List
+from typing import List, Tuple
 from utils.ollama_helper import OllamaHelper
-import json
+from utils.model_selector import ModelSelector
+from utils.ai_cache import AICache, get_ai_cache
+from utils import json_utils
+from utils.text_utils import head_tail
+import logging
+import string
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+
+# Punctuation stripped from the ends of tags (quotes, trailing commas/periods).
+# Only the ends are stripped so "node.js" keeps its dot, and "-", "+" and "#"
+# are never stripped ("e-commerce", "c++", "c#"); neither is a leading "." (".net")
+_TAG_TRAILING = string.punctuation.replace("-", "").replace("+", "").replace("#", "") + string.whitespace
+_TAG_LEADING = _TAG_TRAILING.replace(".", "")
+
+# Small-model answers with fewer tags than this are re-asked to the large model
+CASCADE_MIN_TAGS = 3
 
 
 class AITagger:
@@ -12,7 +31,112 @@ class AITagger:
     
     def __init__(self):
         """Initialize AI tagger with Ollama"""
-        self.ollama = OllamaHelper()
+        small_model, large_model = ModelSelector.get_cascade_models()
+        self.ollama = OllamaHelper(model=large_model)
+        # Cheap first-pass model (None when the cascade is disabled)
+        self.ollama_small = OllamaHelper(model=small_model) if small_model else None
+        
+        # Check connection (once per process)
+        self.ollama.probe_once()
+    
+    @staticmethod
+    def _clean_tags(tags) -> List[str]:
+        """
+        Normalize a parsed AI response into a clean list of tags
+        
+        Args:
+            tags: Parsed JSON (list, dict wrapping a list, or single string)
+            
+        Returns:
+            List of cleaned tag strings (max 5)
+        """
+        # Handle different response formats
+        # Sometimes Ollama returns {'tags': [...]} instead of just [...]
+        if isinstance(tags, dict):
+            # Check for common keys
+            if 'tags' in tags:
+                tags = tags['tags']
+            elif 'tag' in tags:
+                tags = tags['tag']
+            else:
+                # Try to extract list from dict values
+                dict_values = list(tags.values())
+                if dict_values and isinstance(dict_values[0], list):
+                    tags = dict_values[0]
+                else:
+                    tags = []
+        
+        # Ensure it's a list
+        if not isinstance(tags, list):
+            if isinstance(tags, str):
+                # Single tag as string
+                tags = [tags]
+            else:
+                tags = [str(tags)] if tags else []
+        
+        # Clean and validate tags: lowercase, strip surrounding punctuation, drop
+        # duplicates (dict.fromkeys keeps the model's order)
+        cleaned = (
+            tag.lower().lstrip(_TAG_LEADING).rstrip(_TAG_TRAILING)
+            for tag in tags[:5]  # Limit to 5 tags
+            if isinstance(tag, str)
+        )
+        return list(dict.fromkeys(tag for tag in cleaned if len(tag) > 1))
+    
+    def _request_tags(self, ollama: OllamaHelper, system_prompt: str, user_prompt: str) -> List[str]:
+        """
+        Ask one model for document tags
+        
+        Args:
+            ollama: Ollama helper (small or large cascade model)
+            system_prompt: Tagging system prompt
+            user_prompt: Prompt with the document preview
+            
+        Returns:
+            List of cleaned tags (empty if the request or parsing failed)
+        """
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+        
+        # Reuse previous answer for an identical prompt (e.g. re-uploaded document)
+        cache = get_ai_cache()
+        cache_key = AICache.make_key('generate_tags', ollama.model, system_prompt, user_prompt)
+        if cache:
+            cached = cache.get(cache_key)
+            if cached:
+                logger.info("✅ Tags served from cache: %s", cached)
+                return cached
+        
+        logger.info("🏷️ Requesting tags from Ollama (%s)...", ollama.model)
+        result = ollama.chat(
+            messages=messages,
+            temperature=0.5,  # Slightly higher for more creative tags
+            format="json"
+        )
+        
+        if result["error"]:
+            logger.warning("⚠️ Tag generation failed: %s", result['error'])
+            return []
+        
+        # Parse JSON response
+        response_text = result["response"]
+        
+        try:
+            tags = json_utils.parse_model_json(response_text, ModelSelector.is_json_reliable(ollama.model))
+            
+            cleaned_tags = self._clean_tags(tags)
+            
+            logger.info("✅ Generated %d tags: %s", len(cleaned_tags), cleaned_tags)
+            if cache and cleaned_tags:
+                cache.set(cache_key, cleaned_tags)
+            return cleaned_tags
+            
+        except json_utils.JSONDecodeError as e:
+            logger.warning("⚠️ Failed to parse tags JSON: %s", e)
+            logger.debug("Response was: %.200s", response_text)
+            return []
     
     def generate_tags(self, document_text: str, document_name: str = "") -> List[str]:
         """
@@ -26,98 +150,145 @@ class AITagger:
             List of tag strings (3-5 tags)
         """
         try:
-            # Limit text for API (keep first 2000 chars)
-            text_preview = document_text[:2000] if len(document_text) > 2000 else document_text
+            # Limit text for API (start + end of the document)
+            text_preview = head_tail(document_text, 1400, 500)
             
+            # Static instructions first so the server can reuse the cached prompt prefix
             system_prompt = """You are a document tagging assistant. 
 Analyze documents and extract key topics, themes, document types, and important entities.
 Generate concise, relevant tags (single words or short phrases).
-Always respond with valid JSON only."""
+Always respond with valid JSON only.
+
+Extract key topics, themes, document type, and important entities.
+Generate concise, relevant tags (single words or short phrases, lowercase).
+
+Respond with a JSON array of strings only:
+["tag1", "tag2", "tag3"]
+
+Make tags specific and useful for searching. Avoid generic tags like "document" or "file"."""
 
             user_prompt = f"""Analyze this document and generate 3-5 relevant tags.
 
 Document Name: {document_name}
 Content:
-{text_preview}
+{text_preview}"""
+
+            if self.ollama_small:
+                tags = self._request_tags(self.ollama_small, system_prompt, user_prompt)
+                if len(tags) >= CASCADE_MIN_TAGS:
+                    return tags
+                logger.info("🔼 Only %d tags from %s, escalating to %s", len(tags), self.ollama_small.model, self.ollama.model)
+            
+            return self._request_tags(self.ollama, system_prompt, user_prompt)
+                
+        except Exception as e:
+            logger.warning("⚠️ Tag generation error: %s", e)
+            return []
+
+    
+    def generate_tags_batch(self, docs: List[Tuple[str, str]]) -> List[List[str]]:
+        """
+        Generate tags for several documents with a single Ollama call
+        
+        Args:
+            docs: List of (document_text, document_name) tuples
+            
+        Returns:
+            List of tag lists, in input order
+        """
+        if not docs:
+            return []
+        if len(docs) == 1:
+            return [self.generate_tags(*docs[0])]
+        
+        try:
+            # Smaller per-document preview so the combined prompt stays bounded
+            documents_str = "\n\n".join(
+                f"[{idx}] Document Name: {name}\nContent:\n{head_tail(text, 700, 250)}"
+                for idx, (text, name) in enumerate(docs, start=1)
+            )
+            
+            system_prompt = """You are a document tagging assistant. 
+Analyze documents and extract key topics, themes, document types, and important entities.
+Generate concise, relevant tags (single words or short phrases).
+Always respond with valid JSON only.
 
-Extract key topics, themes, document type, and important entities.
 Generate concise, relevant tags (single words or short phrases, lowercase).
 
-Respond with a JSON array of strings only:
-["tag1", "tag2", "tag3"]
+Respond with JSON in this exact format, one entry per document:
+{
+    "results": [
+        {"idx": 1, "tags": ["tag1", "tag2", "tag3"]}
+    ]
+}
 
 Make tags specific and useful for searching. Avoid generic tags like "document" or "file"."""
 
+            user_prompt = f"""Analyze each of the following documents and generate 3-5 relevant tags for each.
+
+Documents:
+{documents_str}"""
+
             messages = [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
             ]
             
-            print(f"🏷️ Requesting tags from Ollama...")
+            logger.info("🏷️ Requesting batch tags for %d documents...", len(docs))
             result = self.ollama.chat(
                 messages=messages,
-                temperature=0.5,  # Slightly higher for more creative tags
+                temperature=0.5,
                 format="json"
             )
             
             if result["error"]:
-                print(f"⚠️ Tag generation failed: {result['error']}")
-                return []
+                raise ValueError(result["error"])
             
-            # Parse JSON response
-            response_text = result["response"]
+            parsed = json_utils.parse_model_json(result["response"], ModelSelector.is_json_reliable(self.ollama.model))
+            entries = parsed.get('results', []) if isinstance(parsed, dict) else parsed
             
-            # Clean JSON if wrapped in markdown
-            if "```json" in response_text:
-                response_text = response_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in response_text:
-                response_text = response_text.split("```")[1].split("```")[0].strip()
+            by_idx = {}
+            for entry in entries:
+                if not isinstance(entry, dict):
+                    continue
+                try:
+                    by_idx[int(entry.get('idx'))] = entry
+                except (TypeError, ValueError):
+                    continue
+            
+            all_tags = []
+            for idx, doc in enumerate(docs, start=1):
+                entry = by_idx.get(idx)
+                if entry is None:
+                    # Model skipped this document - tag it on its own
+                    all_tags.append(self.generate_tags(*doc))
+                else:
+                    all_tags.append(self._clean_tags(entry.get('tags', [])))
+            
+            logger.info("✅ Batch tagged %d documents", len(all_tags))
+            return all_tags
             
-            try:
-                tags = json.loads(response_text)
-                
-                # Handle different response formats
-                # Sometimes Ollama returns {'tags': [...]} instead of just [...]
-                if isinstance(tags, dict):
-                    # Check for common keys
-                    if 'tags' in tags:
-                        tags = tags['tags']
-                    elif 'tag' in tags:
-                        tags = tags['tag']
-                    else:
-                        # Try to extract list from dict values
-                        dict_values = list(tags.values())
-                        if dict_values and isinstance(dict_values[0], list):
-                            tags = dict_values[0]
-                        else:
-                            tags = []
-                
-                # Ensure it's a list
-                if not isinstance(tags, list):
-                    if isinstance(tags, str):
-                        # Single tag as string
-                        tags = [tags]
-                    else:
-                        tags = [str(tags)] if tags else []
-                
-                # Clean and validate tags
-                cleaned_tags = []
-                for tag in tags[:5]:  # Limit to 5 tags
-                    if isinstance(tag, str):
-                        # Clean tag: lowercase, remove extra spaces
-                        cleaned_tag = tag.strip().lower()
-                        if cleaned_tag and len(cleaned_tag) > 1:
-                            cleaned_tags.append(cleaned_tag)
-                
-                print(f"✅ Generated {len(cleaned_tags)} tags: {', '.join(cleaned_tags)}")
-                return cleaned_tags
-                
-            except json.JSONDecodeError as e:
-                print(f"⚠️ Failed to parse tags JSON: {str(e)}")
-                print(f"Response was: {response_text[:200]}")
-                return []
-                
         except Exception as e:
-            print(f"⚠️ Tag generation error: {str(e)}")
-            return []
+            logger.warning("⚠️ Batch tagging failed, falling back to single requests: %s", e)
+            return [self.generate_tags(text, name) for text, name in docs]
+
 
+_ai_tagger = None
+_ai_tagger_lock = threading.Lock()
+
+
+def get_ai_tagger() -> AITagger:
+    """
+    Get shared AI tagger instance (created once per process, on first use)
+    
+    Returns:
+        AITagger
+    """
+    global _ai_tagger
+    
+    if _ai_tagger is None:
+        with _ai_tagger_lock:
+            if _ai_tagger is None:
+                _ai_tagger = AITagger()
+    
+    return _ai_tagger
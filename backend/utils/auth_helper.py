@@ -3,25 +3,85 @@ Authentication helper functions
 Password hashing and JWT utilities
 """
 from werkzeug.security import generate_password_hash, check_password_hash
+from flask import current_app
 from flask_jwt_extended import create_access_token, create_refresh_token
 from datetime import timedelta
+import threading
+import time
+
+try:
+    from argon2 import PasswordHasher
+    from argon2.exceptions import InvalidHashError, VerificationError
+except ImportError:  # argon2-cffi not installed - keep using werkzeug PBKDF2 hashes
+    PasswordHasher = None
+
+
+# Tokens issued for the same identity within this many seconds are reused -
+# separate logins by the same user inside the window get the same tokens
+# (same jti), so revoking one revokes the other
+TOKEN_CACHE_TTL = 5.0
+TOKEN_CACHE_MAX_ENTRIES = 128
+
+# (signing key, user_id, email) -> (issued_at, tokens)
+_TOKEN_CACHE = {}
+_TOKEN_CACHE_LOCK = threading.Lock()
+
+# Fields exposed in user API responses (password hash and other columns are dropped)
+_USER_RESPONSE_KEYS = (
+    'id', 'name', 'email', 'role', 'department', 'phone',
+    'profile_image_url', 'is_active', 'last_login', 'created_at'
+)
+_USER_DATETIME_INDEXES = (
+    _USER_RESPONSE_KEYS.index('last_login'),
+    _USER_RESPONSE_KEYS.index('created_at')
+)
+
+# argon2id hasher (None when argon2-cffi is unavailable)
+_HASHER = PasswordHasher(time_cost=2, memory_cost=64 * 1024, parallelism=2) if PasswordHasher else None
 
 
 def hash_password(password):
-    """Hash a password"""
+    """Hash a password (argon2id when available, werkzeug PBKDF2 otherwise)"""
+    if _HASHER:
+        return _HASHER.hash(password)
     return generate_password_hash(password, method='pbkdf2:sha256')
 
 
 def verify_password(password_hash, password):
-    """Verify a password against its hash"""
+    """Verify a password against its hash (argon2 or legacy werkzeug hash)"""
     if not password_hash:
         return False
+    
+    if password_hash.startswith('$argon2'):
+        if not _HASHER:
+            return False
+        try:
+            return _HASHER.verify(password_hash, password)
+        except (VerificationError, InvalidHashError):
+            return False
+    
     return check_password_hash(password_hash, password)
 
 
+def password_needs_rehash(password_hash):
+    """
+    Check if a stored hash should be replaced after a successful login
+    True for legacy PBKDF2 hashes (when argon2 is available) and for argon2
+    hashes created with different cost parameters
+    """
+    if not _HASHER or not password_hash:
+        return False
+    if not password_hash.startswith('$argon2'):
+        return True
+    return _HASHER.check_needs_rehash(password_hash)
+
+
 def create_tokens(user_id, email):
     """
     Create access and refresh tokens
+    Bursts for the same identity (e.g. repeated refreshes) reuse the tokens
+    signed in the last TOKEN_CACHE_TTL seconds by the same signing key, so
+    apps with different JWT_SECRET_KEYs in one process never share tokens
     
     Args:
         user_id: User ID
@@ -30,6 +90,14 @@ def create_tokens(user_id, email):
     Returns:
         Dict with access_token and refresh_token
     """
+    key = (current_app.config['JWT_SECRET_KEY'], user_id, email)
+    now = time.monotonic()
+    
+    with _TOKEN_CACHE_LOCK:
+        cached = _TOKEN_CACHE.get(key)
+        if cached and now - cached[0] < TOKEN_CACHE_TTL:
+            return dict(cached[1])
+    
     identity = {
         'id': user_id,
         'email': email
@@ -38,10 +106,21 @@ def create_tokens(user_id, email):
     access_token = create_access_token(identity=identity)
     refresh_token = create_refresh_token(identity=identity)
     
-    return {
+    tokens = {
         'access_token': access_token,
         'refresh_token': refresh_token
     }
+    
+    with _TOKEN_CACHE_LOCK:
+        if len(_TOKEN_CACHE) >= TOKEN_CACHE_MAX_ENTRIES:
+            # Drop expired entries; clear everything if all are still fresh
+            for stale_key in [k for k, (ts, _) in _TOKEN_CACHE.items() if now - ts >= TOKEN_CACHE_TTL]:
+                del _TOKEN_CACHE[stale_key]
+            if len(_TOKEN_CACHE) >= TOKEN_CACHE_MAX_ENTRIES:
+                _TOKEN_CACHE.clear()
+        _TOKEN_CACHE[key] = (now, tokens)
+    
+    return dict(tokens)
 
 
 def format_user_response(user):
@@ -58,18 +137,24 @@ def format_user_response(user):
     if not user:
         return None
     
-    return {
-        'id': user['id'],
-        'name': user['name'],
-        'email': user['email'],
-        'role': user['role'],
-        'department': user.get('department'),
-        'phone': user.get('phone'),
-        'profile_image_url': user.get('profile_image_url'),
-        'is_active': user['is_active'],
-        'last_login': user.get('last_login').isoformat() if user.get('last_login') else None,
-        'created_at': user.get('created_at').isoformat() if user.get('created_at') else None
-    }
+    values = [user.get(key) for key in _USER_RESPONSE_KEYS]
+    for i in _USER_DATETIME_INDEXES:
+        if values[i]:
+            values[i] = values[i].isoformat()
+    return dict(zip(_USER_RESPONSE_KEYS, values))
+
+
+def format_user_responses(users):
+    """
+    Format a list of users for API response (see format_user_response)
+    
+    Args:
+        users: List of user dicts from database
+    
+    Returns:
+        List of formatted user dicts
+    """
+    return [format_user_response(user) for user in users]
 
 
 
@@ -0,0 +1,118 @@
+"""
+Disk Cache - JSON files keyed by content hash
+Used for extracted PDF text and OCR results; least recently used entries are
+pruned so the cache directory doesn't grow with every distinct upload
+"""
+import logging
+import os
+import tempfile
+import threading
+from typing import Any, Optional
+
+from utils import json_utils
+
+
+logger = logging.getLogger(__name__)
+
+
+class DiskCache:
+    """Directory of JSON entries capped at max_entries (least recently used are removed)"""
+
+    # Prune every N writes instead of listing the directory on each write
+    PRUNE_EVERY = 50
+
+    def __init__(self, directory: str, max_entries: int):
+        """
+        Initialize disk cache
+
+        Args:
+            directory: Directory holding the entries (created on first write)
+            max_entries: Maximum entries kept
+        """
+        self.directory = directory
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Get cached value
+
+        Args:
+            key: Cache key (hex digest)
+
+        Returns:
+            Cached value or None on miss
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = json_utils.loads(f.read())
+        except (OSError, ValueError):
+            return None
+
+        try:
+            # Touch entry so pruning is least-recently-used
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def set(self, key: str, value: Any):
+        """
+        Store value (atomic write via temp file + rename)
+
+        Args:
+            key: Cache key (hex digest)
+            value: JSON-serializable value
+        """
+        tmp_path = None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with tempfile.NamedTemporaryFile('w', dir=self.directory, suffix='.tmp',
+                                             delete=False, encoding='utf-8') as f:
+                tmp_path = f.name
+                f.write(json_utils.dumps(value))
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            logger.warning("⚠️ Could not write cache entry in %s: %s", self.directory, e)
+            if tmp_path and os.path.exists(tmp_path):
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+            return
+
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % self.PRUNE_EVERY == 0
+        if prune:
+            self.prune()
+
+    def prune(self):
+        """Remove least recently used entries beyond max_entries"""
+        entries = []
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name.endswith('.json'):
+                        try:
+                            entries.append((entry.stat().st_mtime, entry.path))
+                        except OSError:
+                            continue  # Removed by another process meanwhile
+        except OSError:
+            return
+
+        excess = len(entries) - self.max_entries
+        if excess <= 0:
+            return
+
+        entries.sort()
+        for _, path in entries[:excess]:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
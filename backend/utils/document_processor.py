@@ -2,15 +2,206 @@
 Document Processor - Background processing for OCR and AI analysis
 Handles the complete pipeline: OCR → AI Categorization → AI Tagging
 """
+import atexit
+import queue
 import threading
-from typing import Dict, Optional
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Dict, List, Optional, Tuple
 from flask import current_app
-from database import execute_query
-from utils.ocr_helper import OCRHelper
-from utils.ai_categorizer import AICategorizer
-from utils.ai_tagger import AITagger
+from database import execute_query, get_cursor
+from utils.ocr_helper import get_ocr_helper, init_ocr_worker, ocr_extract
+from utils.ai_categorizer import get_ai_categorizer
+from utils.ai_tagger import get_ai_tagger
+from utils.ai_chatbot import invalidate_document_context
+from utils.s3_helper import download_file
+from utils import json_utils
+from utils.text_utils import head_tail
+from utils.disk_cache import DiskCache
+import hashlib
+import mmap
 import os
-import json
+import logging
+import re
+import tempfile
+
+try:
+    import blake3
+except ImportError:  # blake3 wheel not available on this deployment
+    blake3 = None
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:  # pypdfium2 not installed - pdfplumber/PyPDF2 only
+    pdfium = None
+
+
+logger = logging.getLogger(__name__)
+
+
+# Digital PDFs: only the first N pages are extracted (for performance)
+MAX_PDF_PAGES = 20
+
+# Characters of document start/end sent to the AI stage (prefill cost grows
+# with prompt length; categorization/tagging only need a window of the text)
+AI_INPUT_HEAD = 1500
+AI_INPUT_TAIL = 500
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def _trim_for_ai(text: str) -> str:
+    """Collapse whitespace runs and keep only the head/tail window of text for AI analysis"""
+    return head_tail(_WHITESPACE_RE.sub(' ', text).strip(), AI_INPUT_HEAD, AI_INPUT_TAIL)
+
+
+# Workers parsing chunks of PDF pages concurrently
+PDF_EXTRACT_WORKERS = min(8, os.cpu_count() or 1)
+_pdf_executor = ThreadPoolExecutor(max_workers=PDF_EXTRACT_WORKERS, thread_name_prefix='pdftext')
+
+
+def _plumber_extract_pages(file_path: str, page_indexes: List[int]) -> List[str]:
+    """Extract text of some PDF pages with pdfplumber (opens its own handle)"""
+    import pdfplumber
+    
+    with pdfplumber.open(file_path, pages=[i + 1 for i in page_indexes]) as pdf:
+        return [page.extract_text() or '' for page in pdf.pages]
+
+
+def _pypdf2_extract_pages(file_path: str, page_indexes: List[int]) -> List[str]:
+    """Extract text of some PDF pages with PyPDF2 (opens its own handle)"""
+    import PyPDF2
+    
+    page_texts = []
+    with open(file_path, 'rb') as f:
+        pdf_reader = PyPDF2.PdfReader(f)
+        for i in page_indexes:
+            try:
+                page_texts.append(pdf_reader.pages[i].extract_text() or '')
+            except Exception:
+                page_texts.append('')
+    return page_texts
+
+
+# PDFium is not thread-safe - calls are serialized (it's fast enough not to need chunking)
+_pdfium_lock = threading.Lock()
+
+
+def _pdfium_extract_pages(file_path: str, max_pages: int) -> List[str]:
+    """Extract text of the first max_pages PDF pages with pypdfium2 (PDFium, native code)"""
+    page_texts = []
+    with _pdfium_lock:
+        pdf = pdfium.PdfDocument(file_path)
+        try:
+            for i in range(min(max_pages, len(pdf))):
+                page = pdf[i]
+                textpage = page.get_textpage()
+                page_texts.append(textpage.get_text_range() or '')
+                textpage.close()
+                page.close()
+        finally:
+            pdf.close()
+    return page_texts
+
+
+def _map_page_chunks(extract_pages, file_path: str, page_count: int) -> List[str]:
+    """
+    Run extract_pages over pages 0..page_count-1 split into one contiguous
+    chunk per worker, returning page texts in page order
+    """
+    if page_count <= 0:
+        return []
+    
+    chunk_size = -(-page_count // PDF_EXTRACT_WORKERS)  # ceil division
+    chunks = [
+        list(range(start, min(start + chunk_size, page_count)))
+        for start in range(0, page_count, chunk_size)
+    ]
+    if len(chunks) == 1:
+        return extract_pages(file_path, chunks[0])
+    
+    results = _pdf_executor.map(partial(extract_pages, file_path), chunks)
+    return [page_text for chunk_texts in results for page_text in chunk_texts]
+
+
+# OCR runs in worker processes: Tesseract itself is native, but image
+# conversion and per-page Python work hold the GIL, so threads don't scale.
+# Every gunicorn worker (WEB_CONCURRENCY, see Dockerfile) builds its own pool,
+# so the default splits half the CPUs between them.
+# Under gunicorn's gevent worker class threading is monkey-patched: the
+# pipeline threads, the thread executors and this pool's management thread
+# are greenlets sharing one OS thread per worker, so the OCR processes are
+# the only part that runs in parallel and blocking work in the others stalls
+# the worker's requests
+WEB_CONCURRENCY = max(1, int(os.environ.get('WEB_CONCURRENCY', '1')))
+OCR_PROCESSES = max(1, int(os.environ.get(
+    'OCR_PROCESSES', (os.cpu_count() or 2) // (2 * WEB_CONCURRENCY)
+)))
+# Page threads inside each OCR process: the processes of all workers share
+# the same half of the CPUs, so this is 1 unless OCR_PROCESSES is lowered
+OCR_PAGE_WORKERS_PER_PROCESS = max(1, (os.cpu_count() or 2) // (2 * WEB_CONCURRENCY * OCR_PROCESSES))
+_ocr_pool: Optional[ProcessPoolExecutor] = None
+_ocr_pool_lock = threading.Lock()
+
+
+def _get_ocr_pool() -> ProcessPoolExecutor:
+    """OCR process pool (created on first use; forkserver rather than forking the threaded app)"""
+    global _ocr_pool
+    
+    with _ocr_pool_lock:
+        if _ocr_pool is None:
+            start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _ocr_pool = ProcessPoolExecutor(
+                max_workers=OCR_PROCESSES,
+                mp_context=multiprocessing.get_context(start_method),
+                initializer=init_ocr_worker,
+                initargs=(OCR_PAGE_WORKERS_PER_PROCESS,)
+            )
+        return _ocr_pool
+
+
+def _run_ocr(file_path: str, file_type: str) -> Tuple[str, Dict]:
+    """
+    Run OCR in the process pool for an image or a PDF already found to be
+    scanned (plain args/results - no app context in workers)
+    """
+    global _ocr_pool
+    
+    try:
+        return _get_ocr_pool().submit(ocr_extract, file_path, file_type).result()
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory) - recreate the pool for later documents
+        logger.warning("⚠️ OCR process pool broken, retrying in-process")
+        with _ocr_pool_lock:
+            if _ocr_pool is not None:
+                _ocr_pool.shutdown(wait=False)
+            _ocr_pool = None
+        return ocr_extract(file_path, file_type)
+
+
+# Extracted PDF text cached on disk by file content hash (reprocessing/retries skip parsing)
+PDF_TEXT_CACHE_DIR = os.environ.get(
+    'PDF_TEXT_CACHE_DIR',
+    os.path.join(tempfile.gettempdir(), 'dochub_pdfcache')
+)
+PDF_TEXT_CACHE_MAX_ENTRIES = int(os.environ.get('PDF_TEXT_CACHE_MAX_ENTRIES', '2000'))
+_text_cache = DiskCache(PDF_TEXT_CACHE_DIR, PDF_TEXT_CACHE_MAX_ENTRIES)
+
+
+def _file_hash(file_path: str) -> str:
+    """Hash file contents (BLAKE3 over a memory map when installed, else blake2b in 1MB chunks)"""
+    with open(file_path, 'rb') as f:
+        if blake3 is not None and os.fstat(f.fileno()).st_size > 0:  # mmap rejects empty files
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return blake3.blake3(mm).hexdigest(16)
+        
+        digest = hashlib.blake2b(digest_size=16)
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+        return digest.hexdigest()
 
 
 class DocumentProcessor:
@@ -30,19 +221,113 @@ class DocumentProcessor:
             # current_app is a proxy; get the underlying app instance
             self.app = current_app._get_current_object()
         
-        self.ocr_helper = OCRHelper()
-        self.ai_categorizer = AICategorizer()
-        self.ai_tagger = AITagger()
+        # Shared per process - constructing a processor per upload is cheap
+        self.ocr_helper = get_ocr_helper()
+        self.ai_categorizer = get_ai_categorizer()
+        self.ai_tagger = get_ai_tagger()
     
-    def process_document(self, document_id: int, file_path: str, file_type: str):
+    def _extract_pdf_text(self, file_path: str) -> Tuple[str, int, str]:
         """
-        Process document: OCR + AI analysis
+        Extract text from the first MAX_PDF_PAGES pages of a digital PDF
+        Uses pypdfium2 when installed; otherwise (or if it fails) pages are
+        split into contiguous chunks parsed concurrently by pdfplumber/PyPDF2,
+        each chunk with its own file handle (pdfminer/PyPDF2 objects are not
+        thread-safe). Results are cached on disk by file hash.
         
-        This method runs the complete pipeline:
-        1. OCR extraction (if needed)
-        2. AI categorization
-        3. AI tagging
-        4. Update database
+        Args:
+            file_path: Path to PDF file
+            
+        Returns:
+            Tuple of (text, pages_extracted, engine name)
+        """
+        file_hash = _file_hash(file_path)
+        cached = _text_cache.get(file_hash)
+        if cached:
+            text = "\n\n".join(page_text for page_text in cached['pages'] if page_text)
+            return text, len(cached['pages']), f"{cached['engine']}, cached"
+        
+        page_texts = None
+        
+        # Try PDFium first (native code, much faster than pdfminer)
+        if pdfium is not None:
+            try:
+                page_texts = _pdfium_extract_pages(file_path, MAX_PDF_PAGES)
+                pages_to_extract = len(page_texts)
+                engine = 'pypdfium2'
+            except Exception as pdfium_error:
+                logger.warning("⚠️ pypdfium2 failed, trying pdfplumber: %s", pdfium_error)
+        
+        if page_texts is None:
+            # Then pdfplumber (better quality than PyPDF2)
+            try:
+                import pdfplumber
+                
+                with pdfplumber.open(file_path) as pdf:
+                    pages_to_extract = min(MAX_PDF_PAGES, len(pdf.pages))
+                
+                page_texts = _map_page_chunks(_plumber_extract_pages, file_path, pages_to_extract)
+                engine = 'pdfplumber'
+                
+            except Exception as plumber_error:
+                # Fallback to PyPDF2
+                logger.warning("⚠️ pdfplumber failed, trying PyPDF2: %s", plumber_error)
+                import PyPDF2
+                
+                with open(file_path, 'rb') as f:
+                    pages_to_extract = min(MAX_PDF_PAGES, len(PyPDF2.PdfReader(f).pages))
+                
+                page_texts = _map_page_chunks(_pypdf2_extract_pages, file_path, pages_to_extract)
+                engine = 'PyPDF2'
+        
+        _text_cache.set(file_hash, {
+            'pages': page_texts,
+            'engine': engine,
+            'word_count': sum(len(page_text.split()) for page_text in page_texts)
+        })
+        
+        text = "\n\n".join(page_text for page_text in page_texts if page_text)
+        return text, pages_to_extract, engine
+    
+    @staticmethod
+    def _flush_updates(document_id: int, updates: Dict, cursor=None):
+        """
+        Write collected column updates for a document in one UPDATE
+        
+        Args:
+            document_id: Document ID in database
+            updates: Column name -> value (column names are internal constants)
+            cursor: Cursor of an open transaction (see get_cursor); if omitted
+                    the UPDATE is committed on its own
+        """
+        columns = sorted(updates)  # Stable column order -> stable statement text
+        assignments = ", ".join(f"{column} = %s" for column in columns)
+        query = f"UPDATE documents SET {assignments} WHERE id = %s"
+        params = tuple(updates[column] for column in columns) + (document_id,)
+        
+        if cursor is not None:
+            cursor.execute(query, params)
+        else:
+            execute_query(query, params, commit=True)
+    
+    @staticmethod
+    def _mark_failed(document_id: int, error: Exception):
+        """Log a processing error and mark the document as failed"""
+        logger.error("❌ Error processing document %s: %s", document_id, error, exc_info=error)
+        
+        # Update status to failed
+        try:
+            execute_query(
+                "UPDATE documents SET status = 'failed', error_message = %s WHERE id = %s",
+                (str(error)[:500], document_id),  # Limit error message length
+                commit=True
+            )
+        except:
+            pass  # If we can't update, at least log the error
+    
+    def extract_document(self, document_id: int, file_path: str,
+                         file_type: str) -> Optional[Tuple[str, str, Dict]]:
+        """
+        Pipeline stage 1: text extraction (OCR or digital PDF parsing)
         
         NOTE: This method assumes an active Flask application context.
         
@@ -50,11 +335,13 @@ class DocumentProcessor:
             document_id: Document ID in database
             file_path: Path to file (temporary file)
             file_type: File extension
+            
+        Returns:
+            (text for AI analysis, document name, pending column updates),
+            or None if the document failed or no longer exists
         """
         try:
-            print(f"\n{'='*60}")
-            print(f"🚀 Starting processing for document ID: {document_id}")
-            print(f"{'='*60}")
+            logger.info("🚀 Starting processing for document ID: %s", document_id)
             
             # Update status to processing
             execute_query(
@@ -63,6 +350,11 @@ class DocumentProcessor:
                 commit=True
             )
             
+            # Column updates are collected here and written in a single UPDATE
+            # once analysis finishes (the 'processing' marker above is the
+            # only intermediate write, for UI liveness)
+            updates = {}
+            
             # Step 1: OCR Extraction
             extracted_text = ""
             ocr_metadata = {}
@@ -77,116 +369,46 @@ class DocumentProcessor:
                 needs_ocr = is_scanned_pdf
             
             if needs_ocr:
-                print(f"📸 Document needs OCR (type: {file_type})")
+                logger.info("📸 Document %s needs OCR (type: %s)", document_id, file_type)
                 try:
-                    extracted_text, ocr_metadata = self.ocr_helper.extract_text(file_path, file_type)
+                    extracted_text, ocr_metadata = _run_ocr(file_path, file_type)
                     
-                    # Update with OCR results
+                    # Record OCR results
                     word_count = ocr_metadata.get('word_count', 0)
-                    execute_query(
-                        """
-                        UPDATE documents 
-                        SET extracted_text = %s, 
-                            processing_status = 'ai_analysis',
-                            word_count = %s
-                        WHERE id = %s
-                        """,
-                        (extracted_text, word_count, document_id),
-                        commit=True
-                    )
+                    updates['extracted_text'] = extracted_text
+                    updates['word_count'] = word_count
                     
-                    print(f"✅ OCR completed: {word_count} words extracted")
+                    logger.info("✅ OCR completed for document %s: %d words extracted", document_id, word_count)
+                    if ocr_metadata.get('truncated'):
+                        # Only the first MAX_OCR_PAGES pages were OCR'd
+                        logger.info("📄 OCR of document %s stopped at %d of %d pages",
+                                    document_id, ocr_metadata.get('pages_processed', 0), ocr_metadata.get('total_pages', 0))
                     
                 except Exception as ocr_error:
-                    print(f"⚠️ OCR failed: {str(ocr_error)}")
+                    logger.warning("⚠️ OCR failed for document %s: %s", document_id, ocr_error)
                     # Continue without extracted text
-                    execute_query(
-                        "UPDATE documents SET processing_status = 'ai_analysis', error_message = %s WHERE id = %s",
-                        (f"OCR failed: {str(ocr_error)}", document_id),
-                        commit=True
-                    )
+                    updates['error_message'] = f"OCR failed: {str(ocr_error)}"
             else:
                 # For digital PDFs, extract text ourselves if not already extracted
-                print(f"📄 Digital document - extracting text from PDF...")
+                logger.info("📄 Digital document %s - extracting text from PDF...", document_id)
                 try:
-                    # Try to extract text from digital PDF using PyPDF2/pdfplumber
-                    import PyPDF2
-                    import pdfplumber
+                    # Try to extract text from digital PDF using pdfplumber/PyPDF2
+                    extracted_text, pages_to_extract, engine = self._extract_pdf_text(file_path)
+                    word_count = len(extracted_text.split())
                     
-                    # Try pdfplumber first (better quality)
-                    try:
-                        with pdfplumber.open(file_path) as pdf:
-                            text_parts = []
-                            total_pages = len(pdf.pages)
-                            # Limit to first 20 pages for performance
-                            pages_to_extract = min(20, total_pages)
-                            
-                            for i in range(pages_to_extract):
-                                page = pdf.pages[i]
-                                page_text = page.extract_text()
-                                if page_text:
-                                    text_parts.append(page_text)
-                            
-                            extracted_text = "\n\n".join(text_parts)
-                            word_count = len(extracted_text.split())
-                            
-                            print(f"✅ Extracted {word_count} words from {pages_to_extract} pages (pdfplumber)")
-                            
-                    except Exception as plumber_error:
-                        # Fallback to PyPDF2
-                        print(f"⚠️ pdfplumber failed, trying PyPDF2: {str(plumber_error)}")
-                        with open(file_path, 'rb') as f:
-                            pdf_reader = PyPDF2.PdfReader(f)
-                            total_pages = len(pdf_reader.pages)
-                            pages_to_extract = min(20, total_pages)
-                            
-                            text_parts = []
-                            for i in range(pages_to_extract):
-                                try:
-                                    page = pdf_reader.pages[i]
-                                    page_text = page.extract_text()
-                                    if page_text:
-                                        text_parts.append(page_text)
-                                except:
-                                    continue
-                            
-                            extracted_text = "\n\n".join(text_parts)
-                            word_count = len(extracted_text.split())
-                            
-                            print(f"✅ Extracted {word_count} words from {pages_to_extract} pages (PyPDF2)")
+                    logger.info("✅ Extracted %d words from %d pages of document %s (%s)", word_count, pages_to_extract, document_id, engine)
                     
-                    # Update database with extracted text
+                    # Record extracted text
                     if extracted_text:
-                        execute_query(
-                            """
-                            UPDATE documents 
-                            SET extracted_text = %s, 
-                                processing_status = 'ai_analysis',
-                                word_count = %s
-                            WHERE id = %s
-                            """,
-                            (extracted_text, word_count, document_id),
-                            commit=True
-                        )
+                        updates['extracted_text'] = extracted_text
+                        updates['word_count'] = word_count
                     else:
-                        print(f"⚠️ No text extracted from PDF")
-                        execute_query(
-                            "UPDATE documents SET processing_status = 'ai_analysis' WHERE id = %s",
-                            (document_id,),
-                            commit=True
-                        )
+                        logger.warning("⚠️ No text extracted from PDF for document %s", document_id)
                         
                 except Exception as pdf_error:
-                    print(f"⚠️ PDF text extraction failed: {str(pdf_error)}")
+                    logger.warning("⚠️ PDF text extraction failed for document %s: %s", document_id, pdf_error)
                     # Continue without extracted text
-                    execute_query(
-                        "UPDATE documents SET processing_status = 'ai_analysis', error_message = %s WHERE id = %s",
-                        (f"PDF extraction failed: {str(pdf_error)}", document_id),
-                        commit=True
-                    )
-            
-            # Step 2: AI Analysis (if we have text or can get it)
-            print(f"🤖 Starting AI analysis...")
+                    updates['error_message'] = f"PDF extraction failed: {str(pdf_error)}"
             
             # Get document name for context
             doc = execute_query(
@@ -196,8 +418,8 @@ class DocumentProcessor:
             )
             
             if not doc:
-                print(f"❌ Document {document_id} not found in database")
-                return
+                logger.error("❌ Document %s not found in database", document_id)
+                return None
             
             doc_name = doc['name'] if doc else ""
             
@@ -205,111 +427,404 @@ class DocumentProcessor:
             if not extracted_text:
                 extracted_text = doc.get('extracted_text', '') or ''
             
-            if extracted_text and len(extracted_text.strip()) > 50:
-                # We have text to analyze
-                print(f"📝 Analyzing {len(extracted_text)} characters of text...")
-                
-                try:
-                    # Generate category suggestion
-                    print(f"  → Generating category suggestion...")
+            # Only a window of the text is needed (and queued) for AI analysis
+            return _trim_for_ai(extracted_text), doc_name, updates
+            
+        except Exception as e:
+            self._mark_failed(document_id, e)
+            return None
+    
+    def _run_ai_analysis(self, document_id: int, extracted_text: str, doc_name: str, updates: Dict,
+                         suggestion: Optional[Dict] = None):
+        """
+        AI categorization + tagging; results (and the final status) are added to updates
+        
+        Args:
+            document_id: Document ID in database
+            extracted_text: Text from extract_document()
+            doc_name: Document name (context for the AI prompts)
+            updates: Pending column updates from extract_document()
+            suggestion: Category (and possibly tags) already obtained from a
+                        batched request (see analyze_documents)
+        """
+        # Step 2: AI Analysis (if we have text)
+        logger.info("🤖 Starting AI analysis for document %s...", document_id)
+        
+        if extracted_text and len(extracted_text.strip()) > 50:
+            # We have text to analyze
+            logger.info("📝 Analyzing %d characters of text...", len(extracted_text))
+            
+            try:
+                # Generate category suggestion
+                if suggestion:
+                    category_result = suggestion
+                else:
+                    logger.debug("  → Generating category suggestion...")
                     category_result = self.ai_categorizer.suggest_category(extracted_text, doc_name)
-                    
-                    # Generate tags
-                    print(f"  → Generating tags...")
+                
+                # Generate tags (unless the batched request already returned them)
+                tags = category_result.get('tags')
+                if not tags:
+                    logger.debug("  → Generating tags...")
                     tags = self.ai_tagger.generate_tags(extracted_text, doc_name)
-                    
-                    # Update database with AI results
-                    execute_query(
-                        """
-                        UPDATE documents 
-                        SET suggested_category = %s,
-                            ai_tags = %s,
-                            processing_status = 'completed',
-                            status = 'ready'
-                        WHERE id = %s
-                        """,
-                        (
-                            category_result['suggested_category'],
-                            json.dumps(tags) if tags else None,
-                            document_id
-                        ),
-                        commit=True
-                    )
-                    
-                    print(f"\n✅ Document {document_id} processed successfully!")
-                    print(f"   📁 Suggested Category: {category_result['suggested_category']} (confidence: {category_result['confidence']:.2f})")
-                    print(f"   🏷️  Tags: {', '.join(tags) if tags else 'None'}")
-                    print(f"{'='*60}\n")
-                    
-                except Exception as ai_error:
-                    print(f"⚠️ AI analysis failed: {str(ai_error)}")
-                    # Update status but don't fail completely
-                    execute_query(
-                        """
-                        UPDATE documents 
-                        SET processing_status = 'completed',
-                            status = 'ready',
-                            error_message = %s
-                        WHERE id = %s
-                        """,
-                        (f"AI analysis failed: {str(ai_error)}", document_id),
-                        commit=True
-                    )
-            else:
-                # No text to analyze (or too short)
-                print(f"⚠️ No sufficient text for AI analysis ({len(extracted_text)} chars)")
-                execute_query(
-                    "UPDATE documents SET status = 'ready', processing_status = 'completed' WHERE id = %s",
-                    (document_id,),
-                    commit=True
+                
+                # Record AI results
+                updates['suggested_category'] = category_result['suggested_category']
+                updates['ai_tags'] = json_utils.dumps(tags) if tags else None
+                
+                logger.info(
+                    "✅ Document %s processed successfully! Category: %s (confidence: %.2f) | Tags: %s",
+                    document_id, category_result['suggested_category'], category_result['confidence'],
+                    ', '.join(tags) if tags else 'None'
                 )
                 
-        except Exception as e:
-            print(f"\n❌ Error processing document {document_id}: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            except Exception as ai_error:
+                logger.warning("⚠️ AI analysis failed for document %s: %s", document_id, ai_error)
+                # Update status but don't fail completely
+                updates['error_message'] = f"AI analysis failed: {str(ai_error)}"
+        else:
+            # No text to analyze (or too short)
+            logger.warning("⚠️ No sufficient text for AI analysis of document %s (%d chars)", document_id, len(extracted_text))
+        
+        updates['processing_status'] = 'completed'
+        updates['status'] = 'ready'
+    
+    def analyze_document(self, document_id: int, extracted_text: str, doc_name: str, updates: Dict,
+                         suggestion: Optional[Dict] = None):
+        """
+        Pipeline stage 2: AI categorization + tagging, then the single
+        UPDATE of everything collected for the document
+        
+        NOTE: This method assumes an active Flask application context.
+        
+        Args:
+            document_id: Document ID in database
+            extracted_text: Text from extract_document()
+            doc_name: Document name (context for the AI prompts)
+            updates: Pending column updates from extract_document()
+            suggestion: Category (and possibly tags) already obtained from a
+                        batched request (see analyze_documents)
+        """
+        try:
+            self._run_ai_analysis(document_id, extracted_text, doc_name, updates, suggestion)
+            self._flush_updates(document_id, updates)
             
-            # Update status to failed
+            # Extracted text may have changed - drop any cached chatbot context
+            invalidate_document_context(document_id)
+            
+        except Exception as e:
+            self._mark_failed(document_id, e)
+    
+    def analyze_documents(self, items: List[Tuple[int, str, str, Dict]]):
+        """
+        Pipeline stage 2 for a batch of documents
+        Documents with enough text are categorized and tagged with one Ollama
+        call (anything the batch doesn't cover falls back to per-document
+        calls), and all results are written in one transaction
+        
+        NOTE: This method assumes an active Flask application context.
+        
+        Args:
+            items: (document_id, extracted_text, doc_name, updates) tuples
+        """
+        analyzable = [item for item in items if item[1] and len(item[1].strip()) > 50]
+        suggestions = {}
+        
+        if len(analyzable) > 1:
             try:
-                execute_query(
-                    "UPDATE documents SET status = 'failed', error_message = %s WHERE id = %s",
-                    (str(e)[:500], document_id),  # Limit error message length
-                    commit=True
+                logger.info("🤖 Batch analyzing %d documents...", len(analyzable))
+                results = self.ai_categorizer.suggest_categories_batch(
+                    [(text, name) for _, text, name, _ in analyzable],
+                    include_tags=True
                 )
-            except:
-                pass  # If we can't update, at least log the error
+                suggestions = {item[0]: result for item, result in zip(analyzable, results)}
+            except Exception as e:
+                logger.warning("⚠️ Batch AI analysis failed, analyzing documents one by one: %s", e)
+        
+        analyzed = []
+        for document_id, extracted_text, doc_name, updates in items:
+            try:
+                self._run_ai_analysis(document_id, extracted_text, doc_name, updates,
+                                      suggestions.get(document_id))
+                analyzed.append((document_id, updates))
+            except Exception as e:
+                self._mark_failed(document_id, e)
+        
+        try:
+            # One commit for the whole batch instead of one per document
+            with get_cursor(commit=True) as cursor:
+                for document_id, updates in analyzed:
+                    self._flush_updates(document_id, updates, cursor)
+        except Exception as e:
+            logger.warning("⚠️ Batched write failed, writing documents one by one: %s", e)
+            for document_id, updates in analyzed:
+                try:
+                    self._flush_updates(document_id, updates)
+                except Exception as write_error:
+                    self._mark_failed(document_id, write_error)
+        
+        # Extracted text may have changed - drop any cached chatbot context
+        for document_id, _ in analyzed:
+            invalidate_document_context(document_id)
+    
+    def process_document(self, document_id: int, file_path: str, file_type: str):
+        """
+        Process document synchronously: OCR + AI analysis
+        
+        This method runs the complete pipeline:
+        1. OCR extraction (if needed)
+        2. AI categorization
+        3. AI tagging
+        4. Update database
+        
+        NOTE: This method assumes an active Flask application context.
+        
+        Args:
+            document_id: Document ID in database
+            file_path: Path to file (temporary file)
+            file_type: File extension
+        """
+        staged = self.extract_document(document_id, file_path, file_type)
+        if staged is not None:
+            self.analyze_document(document_id, *staged)
     
-    def process_async(self, document_id: int, file_path: str, file_type: str):
+    def process_async(self, document_id: int, file_path: str, file_type: str) -> bool:
         """
-        Process document in background thread
+        Queue document for background processing
+        The document goes through the shared pipeline (see start_pipeline):
+        extraction and AI analysis run on separate worker threads, so OCR of
+        one document overlaps with the Ollama calls for another
         
         Args:
             document_id: Document ID in database
-            file_path: Path to file (will be deleted after processing)
+            file_path: Path to file (will be deleted after extraction)
             file_type: File extension
             
         Returns:
-            Thread object
+            True if queued; False if the pipeline stayed full for
+            PIPELINE_PUT_TIMEOUT seconds (the document is then marked failed
+            and the temp file deleted, so the upload request doesn't hang)
         """
-        def process_and_cleanup():
-            # Ensure all DB and config access happens inside an application context
-            with self.app.app_context():
-                try:
-                    self.process_document(document_id, file_path, file_type)
-                finally:
-                    # Clean up temporary file if it exists
-                    if os.path.exists(file_path):
-                        try:
-                            os.unlink(file_path)
-                            print(f"🧹 Cleaned up temporary file: {file_path}")
-                        except Exception:
-                            pass
-        
-        thread = threading.Thread(
-            target=process_and_cleanup,
-            daemon=True
+        start_pipeline(self.app)
+        
+        # Marked before queueing, so a document lost with the queue (worker
+        # restart) is picked up again by _requeue_stale_documents
+        execute_query(
+            "UPDATE documents SET status = 'processing', processing_status = 'queued' WHERE id = %s",
+            (document_id,),
+            commit=True
         )
-        thread.start()
-        print(f"🔄 Started background processing thread for document {document_id}")
-        return thread
+        
+        try:
+            _ocr_q.put((document_id, file_path, file_type), timeout=PIPELINE_PUT_TIMEOUT)
+        except queue.Full:
+            self._mark_failed(document_id, RuntimeError("Processing queue is full - please try again later"))
+            _remove_temp_file(file_path)
+            return False
+        
+        logger.info("🔄 Queued document %s for background processing", document_id)
+        return True
+
+
+def _remove_temp_file(file_path: str):
+    """Delete a temporary upload file if it still exists"""
+    if os.path.exists(file_path):
+        try:
+            os.unlink(file_path)
+            logger.debug("🧹 Cleaned up temporary file: %s", file_path)
+        except Exception:
+            pass
+
+
+# Processing pipeline: _ocr_q -> extraction workers -> _ai_q -> AI worker
+# Bounded so uploads block (backpressure) rather than queueing without limit
+PIPELINE_QUEUE_SIZE = 32
+
+# Longest an upload request waits for room in the pipeline before giving up
+PIPELINE_PUT_TIMEOUT = 5
+
+# Documents left in 'processing' this long are assumed lost with an earlier
+# server process (restarted while queued or mid-processing) and re-queued
+STALE_PROCESSING_MINUTES = int(os.environ.get('STALE_PROCESSING_MINUTES', '15'))
+
+# Extraction threads (caps concurrent OCR/PDF parsing regardless of upload bursts)
+DOC_WORKERS = max(1, int(os.environ.get('DOC_WORKERS', '4')))
+_ocr_q: "queue.Queue[Tuple[int, str, str]]" = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+_ai_q: "queue.Queue[Tuple[int, str, str, Dict]]" = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+
+# AI worker takes up to AI_BATCH_SIZE queued documents at a time, waiting at
+# most AI_BATCH_TIMEOUT seconds for the batch to fill
+AI_BATCH_SIZE = 8
+AI_BATCH_TIMEOUT = 0.2
+
+_pipeline_lock = threading.Lock()
+_pipeline_started = False
+_pipeline_processor: Optional[DocumentProcessor] = None
+
+
+def _get_pipeline_processor(app) -> DocumentProcessor:
+    """Processor shared by the pipeline workers (created on first use, inside an app context)"""
+    global _pipeline_processor
+    
+    with _pipeline_lock:
+        if _pipeline_processor is None:
+            _pipeline_processor = DocumentProcessor(app=app)
+        return _pipeline_processor
+
+
+def _extract_worker(app):
+    """Pipeline stage 1: extract text, delete the temp file, hand off to the AI stage"""
+    with app.app_context():
+        processor = _get_pipeline_processor(app)
+    
+    while True:
+        item = _ocr_q.get()
+        if item is None:  # Shutdown sentinel (stop_pipeline)
+            _ocr_q.task_done()
+            return
+        
+        document_id, file_path, file_type = item
+        try:
+            # Fresh app context per document, so its DB connection is closed
+            # afterwards instead of idling (and timing out) between uploads
+            with app.app_context():
+                staged = processor.extract_document(document_id, file_path, file_type)
+            if staged is not None:
+                _ai_q.put((document_id,) + staged)
+        except Exception as e:
+            logger.exception("❌ Extraction worker error for document %s: %s", document_id, e)
+        finally:
+            _remove_temp_file(file_path)
+            _ocr_q.task_done()
+
 
+def _drain_ai_batch() -> List[Optional[Tuple[int, str, str, Dict]]]:
+    """
+    Block for the next AI item, then collect more until AI_BATCH_SIZE or AI_BATCH_TIMEOUT
+    Collection stops at the shutdown sentinel (None), which is kept as the last item
+    """
+    batch = [_ai_q.get()]
+    deadline = time.monotonic() + AI_BATCH_TIMEOUT
+    while len(batch) < AI_BATCH_SIZE and batch[-1] is not None:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(_ai_q.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+
+def _ai_worker(app):
+    """Pipeline stage 2: AI categorization + tagging and the final database write"""
+    with app.app_context():
+        processor = _get_pipeline_processor(app)
+    
+    while True:
+        batch = _drain_ai_batch()
+        items = [item for item in batch if item is not None]
+        try:
+            if items:
+                # Fresh app context (and DB connection) per batch
+                with app.app_context():
+                    processor.analyze_documents(items)
+        except Exception as e:
+            logger.exception("❌ AI worker error for documents %s: %s", [item[0] for item in items], e)
+        finally:
+            for _ in batch:
+                _ai_q.task_done()
+        
+        if len(items) < len(batch):  # Shutdown sentinel (stop_pipeline)
+            return
+
+
+def _requeue_stale_documents(app):
+    """
+    Re-queue documents stuck in 'processing' (see STALE_PROCESSING_MINUTES)
+    Each document is claimed with a conditional UPDATE first, so when several
+    server processes start together only one of them re-queues it. The file
+    is downloaded again from S3, since the upload's temp file is gone
+    """
+    try:
+        with app.app_context():
+            stale = execute_query(
+                """
+                SELECT id, s3_key, file_type FROM documents
+                WHERE status = 'processing' AND updated_at < NOW() - INTERVAL %s MINUTE
+                """,
+                (STALE_PROCESSING_MINUTES,),
+                fetch_all=True
+            ) or []
+    except Exception as e:
+        logger.warning("⚠️ Could not check for stale documents: %s", e)
+        return
+    
+    for doc in stale:
+        document_id = doc['id']
+        with app.app_context():
+            try:
+                with get_cursor(commit=True) as cursor:
+                    claimed = cursor.execute(
+                        """
+                        UPDATE documents SET processing_status = 'queued', updated_at = CURRENT_TIMESTAMP
+                        WHERE id = %s AND status = 'processing' AND updated_at < NOW() - INTERVAL %s MINUTE
+                        """,
+                        (document_id, STALE_PROCESSING_MINUTES)
+                    )
+                if not claimed:
+                    continue  # Re-queued by another process
+                
+                result = download_file(
+                    s3_key=doc['s3_key'],
+                    file_name=f"dochub_requeue_{document_id}.{doc['file_type']}",
+                    destination_path=tempfile.gettempdir()
+                )
+                if not result.get('success'):
+                    raise RuntimeError(f"S3 download failed: {result.get('error', 'unknown error')}")
+            except Exception as e:
+                DocumentProcessor._mark_failed(document_id, e)
+                continue
+        
+        # This thread isn't serving a request, so it can wait for queue space
+        _ocr_q.put((document_id, result['file_path'], doc['file_type']))
+        logger.info("🔁 Re-queued stale document %s", document_id)
+
+
+def start_pipeline(app):
+    """
+    Start the document processing worker threads (once per process)
+    
+    Args:
+        app: Flask application instance (workers push its app context)
+    """
+    global _pipeline_started
+    
+    with _pipeline_lock:
+        if _pipeline_started:
+            return
+        _pipeline_started = True
+    
+    for i in range(DOC_WORKERS):
+        threading.Thread(target=_extract_worker, args=(app,), name=f'doc-extract-{i}', daemon=True).start()
+    threading.Thread(target=_ai_worker, args=(app,), name='doc-ai', daemon=True).start()
+    threading.Thread(target=_requeue_stale_documents, args=(app,), name='doc-requeue', daemon=True).start()
+    atexit.register(stop_pipeline)
+    logger.info("🔄 Document processing pipeline started (%d extraction workers)", DOC_WORKERS)
+
+
+def stop_pipeline():
+    """
+    Ask the pipeline workers to exit once they finish their current item
+    Registered with atexit; doesn't wait for them (workers are daemon threads)
+    """
+    if not _pipeline_started:
+        return
+    
+    # One sentinel (None) per worker
+    for q, workers in ((_ocr_q, DOC_WORKERS), (_ai_q, 1)):
+        for _ in range(workers):
+            try:
+                q.put_nowait(None)
+            except queue.Full:
+                pass  # Workers are busy with queued work; process exit stops them
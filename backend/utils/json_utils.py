@@ -0,0 +1,90 @@
+"""
+JSON Utilities - Fast JSON parsing/serialization
+Uses orjson when installed, falls back to the stdlib json module otherwise
+"""
+import json
+import re
+
+try:
+    import orjson
+except ImportError:  # orjson wheel not available on this deployment
+    orjson = None
+
+
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers can keep
+# catching the stdlib exception regardless of which backend is active.
+JSONDecodeError = json.JSONDecodeError
+
+# Matches a ```json ... ``` (or bare ``` ... ```) markdown fence around a response
+_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
+
+
+def loads(data):
+    """
+    Parse JSON from str or bytes
+
+    Args:
+        data: JSON document (str, bytes or bytearray)
+
+    Returns:
+        Parsed Python object
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj) -> str:
+    """
+    Serialize object to a JSON string
+
+    Args:
+        obj: Python object to serialize
+
+    Returns:
+        JSON string
+    """
+    if orjson is not None:
+        return orjson.dumps(obj).decode('utf-8')
+    return json.dumps(obj)
+
+
+def dumps_bytes(obj) -> bytes:
+    """
+    Serialize object to UTF-8 encoded JSON (e.g. for an HTTP request body)
+
+    Args:
+        obj: Python object to serialize
+
+    Returns:
+        JSON bytes
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode('utf-8')
+
+
+def parse_model_json(response_text: str, json_reliable: bool = False):
+    """
+    Parse a JSON response from an LLM
+    Responses from models that honor format="json" are parsed directly; others
+    (or a failed direct parse) have any markdown code fence stripped first
+
+    Args:
+        response_text: Model response
+        json_reliable: Model reliably returns bare JSON (see ModelSelector.is_json_reliable)
+
+    Returns:
+        Parsed Python object
+
+    Raises:
+        JSONDecodeError: If the response is not valid JSON
+    """
+    if json_reliable:
+        try:
+            return loads(response_text)
+        except JSONDecodeError:
+            pass  # Fall back to the cleanup path
+
+    fence = _FENCE_RE.search(response_text)
+    return loads(fence.group(1).strip() if fence else response_text.strip())
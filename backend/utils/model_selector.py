@@ -5,10 +5,22 @@ Uses smaller/faster models for simple queries, better models for complex ones
 import re
 import requests
 import os
-from typing import Dict, List
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
 from flask import current_app
 
 
+@dataclass(frozen=True, slots=True)
+class Tier:
+    """Model tier: candidate models (by preference) and generation settings"""
+    models: Tuple[str, ...]
+    default: str
+    max_tokens: int
+    temperature: float
+
+
 class ModelSelector:
     """Select optimal Ollama model based on query characteristics"""
     
@@ -17,54 +29,58 @@ class ModelSelector:
     MODELS = {
         # Fast models for simple queries (1-3 words, yes/no, greetings)
         # These are the smallest and fastest models
-        'fast': {
-            'models': [
+        'fast': Tier(
+            models=(
                 'llama3.2:1b-instruct-q4_K_M',  # Smallest, fastest
                 'tinyllama:latest',              # Alternative tiny model
                 'llama3.2:3b'                    # Fallback if 1b not available
-            ],
-            'default': 'llama3.2:1b-instruct-q4_K_M',
-            'max_tokens': 200,
-            'temperature': 0.2
-        },
+            ),
+            default='llama3.2:1b-instruct-q4_K_M',
+            max_tokens=200,
+            temperature=0.2
+        ),
         # Medium models for moderate queries (4-10 words, simple questions)
         # Balance between speed and quality
-        'medium': {
-            'models': [
+        'medium': Tier(
+            models=(
                 'llama3.2:3b-instruct-q4_K_M',  # Best medium model
                 'llama3.2:3b',                   # Alternative
                 'phi3:mini'                      # Another option
-            ],
-            'default': 'llama3.2:3b-instruct-q4_K_M',
-            'max_tokens': 500,
-            'temperature': 0.3
-        },
+            ),
+            default='llama3.2:3b-instruct-q4_K_M',
+            max_tokens=500,
+            temperature=0.3
+        ),
         # Better models for complex queries (long questions, analysis, summaries)
         # Higher quality for complex tasks
-        'complex': {
-            'models': [
+        'complex': Tier(
+            models=(
                 'llama3.1:8b',                   # High quality, balanced
                 'llama3:8b-instruct-q4_K_M',     # Instruct-tuned variant
                 'llama2:latest'                  # Fallback
-            ],
-            'default': 'llama3.1:8b',
-            'max_tokens': 1000,
-            'temperature': 0.3
-        },
+            ),
+            default='llama3.1:8b',
+            max_tokens=1000,
+            temperature=0.3
+        ),
         # Best model for very complex tasks (multi-document, deep analysis)
         # Use the best available model for advanced tasks
-        'advanced': {
-            'models': [
+        'advanced': Tier(
+            models=(
                 'llama3:8b-instruct-q4_K_M',     # Instruct-tuned for better following
                 'llama3.1:8b',                   # High quality
                 'llama2:latest'                  # Fallback
-            ],
-            'default': 'llama3:8b-instruct-q4_K_M',
-            'max_tokens': 2000,
-            'temperature': 0.3
-        }
+            ),
+            default='llama3:8b-instruct-q4_K_M',
+            max_tokens=2000,
+            temperature=0.3
+        )
     }
     
+    # Model families that reliably honor format="json" (no markdown fences or
+    # preamble around the response), matched by name prefix
+    JSON_RELIABLE_MODELS = frozenset({'llama3.1', 'llama3.2', 'qwen2.5', 'mistral-nemo'})
+    
     # Simple question patterns (use fast models)
     SIMPLE_PATTERNS = [
         r'^(hi|hello|hey|greetings)\s*[!?.]?$',
@@ -83,6 +99,22 @@ class ModelSelector:
         'extract', 'list all', 'find all', 'search for'
     ]
     
+    # Available-models list is reused for this many seconds per Ollama server
+    MODELS_CACHE_TTL = 60.0
+    
+    # base_url -> (fetched_at, models); refreshes are serialized by the lock
+    _models_cache: Dict[str, Tuple[float, List[str]]] = {}
+    _models_cache_lock = threading.Lock()
+    
+    # Compiled once: all simple patterns fused into one alternation
+    _SIMPLE_RE = re.compile('|'.join(f'(?:{p})' for p in SIMPLE_PATTERNS), re.IGNORECASE)
+    
+    # Single-word indicators are matched against the question's words (set
+    # lookup); only multi-word phrases need a substring search
+    _COMPLEX_WORDS = frozenset(w for w in COMPLEX_INDICATORS if ' ' not in w)
+    _COMPLEX_PHRASES = tuple(w for w in COMPLEX_INDICATORS if ' ' in w)
+    _WORD_RE = re.compile(r'\w+')
+    
     @classmethod
     def detect_complexity(cls, question: str, document_context_length: int = 0, 
                           has_multiple_documents: bool = False) -> str:
@@ -105,13 +137,13 @@ class ModelSelector:
             return 'advanced'
         
         # Check for simple patterns first (very fast)
-        for pattern in cls.SIMPLE_PATTERNS:
-            if re.match(pattern, question, re.IGNORECASE):
-                return 'fast'
+        if cls._SIMPLE_RE.match(question):
+            return 'fast'
         
         # Check for complex indicators
-        has_complex_keywords = any(
-            indicator in question for indicator in cls.COMPLEX_INDICATORS
+        has_complex_keywords = (
+            not cls._COMPLEX_WORDS.isdisjoint(cls._WORD_RE.findall(question))
+            or any(phrase in question for phrase in cls._COMPLEX_PHRASES)
         )
         
         # Very short questions (1-3 words) - fast
@@ -158,11 +190,11 @@ class ModelSelector:
         tier_config = cls.MODELS[complexity]
         
         # Select model from tier
-        selected_model = tier_config['default']
+        selected_model = tier_config.default
         
         # If available_models provided, try to match available models
         if available_models:
-            for model in tier_config['models']:
+            for model in tier_config.models:
                 if model in available_models:
                     selected_model = model
                     break
@@ -170,11 +202,25 @@ class ModelSelector:
         return {
             'model': selected_model,
             'tier': complexity,
-            'temperature': tier_config['temperature'],
-            'max_tokens': tier_config.get('max_tokens'),
+            'temperature': tier_config.temperature,
+            'max_tokens': tier_config.max_tokens,
             'reason': f"Selected {complexity} tier model for query"
         }
     
+    @classmethod
+    def is_json_reliable(cls, model_name: str) -> bool:
+        """
+        Check whether a model's format="json" output can be parsed directly
+        
+        Args:
+            model_name: Name of the model (e.g. 'llama3.1:8b')
+            
+        Returns:
+            True if the model family is in JSON_RELIABLE_MODELS
+        """
+        family = (model_name or '').split(':', 1)[0].lower()
+        return family.startswith(tuple(cls.JSON_RELIABLE_MODELS))
+    
     @classmethod
     def get_model_info(cls, model_name: str) -> Dict:
         """
@@ -187,11 +233,11 @@ class ModelSelector:
             Dict with model tier and capabilities
         """
         for tier, config in cls.MODELS.items():
-            if model_name in config['models'] or model_name == config['default']:
+            if model_name in config.models or model_name == config.default:
                 return {
                     'tier': tier,
-                    'temperature': config['temperature'],
-                    'max_tokens': config.get('max_tokens'),
+                    'temperature': config.temperature,
+                    'max_tokens': config.max_tokens,
                     'is_fast': tier in ['fast', 'medium'],
                     'is_advanced': tier in ['complex', 'advanced']
                 }
@@ -209,12 +255,13 @@ class ModelSelector:
     def get_available_models(cls, base_url: str = None) -> List[str]:
         """
         Get list of available models from Ollama server
+        A non-empty list is reused for MODELS_CACHE_TTL seconds (see invalidate_models_cache)
         
         Args:
             base_url: Ollama base URL (defaults to config)
             
         Returns:
-            List of available model names
+            List of available model names (shared - don't modify)
         """
         try:
             # Get base URL
@@ -225,21 +272,48 @@ class ModelSelector:
                     base_url = os.environ.get('OLLAMA_BASE_URL', 'http://localhost:11434')
             
             base_url = base_url.rstrip('/')
-            url = f"{base_url}/api/tags"
             
-            response = requests.get(url, timeout=5)
-            if response.status_code == 200:
-                data = response.json()
-                models = [model['name'] for model in data.get('models', [])]
-                print(f"✅ Found {len(models)} available Ollama models")
-                return models
-            else:
-                print(f"⚠️ Failed to fetch models: {response.status_code}")
-                return []
+            cached = cls._models_cache.get(base_url)
+            if cached and time.monotonic() - cached[0] < cls.MODELS_CACHE_TTL:
+                return cached[1]
+            
+            # One request refreshes the list; concurrent callers wait and reuse it
+            with cls._models_cache_lock:
+                cached = cls._models_cache.get(base_url)
+                if cached and time.monotonic() - cached[0] < cls.MODELS_CACHE_TTL:
+                    return cached[1]
+                
+                url = f"{base_url}/api/tags"
+                
+                response = requests.get(url, timeout=5)
+                if response.status_code == 200:
+                    data = response.json()
+                    models = [model['name'] for model in data.get('models', [])]
+                    print(f"✅ Found {len(models)} available Ollama models")
+                    if models:
+                        cls._models_cache[base_url] = (time.monotonic(), models)
+                    return models
+                else:
+                    print(f"⚠️ Failed to fetch models: {response.status_code}")
+                    return []
         except Exception as e:
             print(f"⚠️ Error fetching available models: {str(e)}")
             return []
     
+    @classmethod
+    def invalidate_models_cache(cls, base_url: str = None):
+        """
+        Forget cached available-models lists (e.g. after pulling a new model)
+        
+        Args:
+            base_url: Only forget this Ollama server's list (all servers if omitted)
+        """
+        with cls._models_cache_lock:
+            if base_url:
+                cls._models_cache.pop(base_url.rstrip('/'), None)
+            else:
+                cls._models_cache.clear()
+    
     @classmethod
     def select_model_with_availability_check(cls, question: str, 
                                              document_context_length: int = 0,
@@ -267,4 +341,35 @@ class ModelSelector:
             has_multiple_documents=has_multiple_documents,
             available_models=available_models if available_models else None
         )
-
+    
+    @classmethod
+    def get_cascade_models(cls) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Get models for the categorizer/tagger cascade
+        The small model answers first; the large model is only asked when the
+        small model's answer is not good enough
+        
+        Returns:
+            Tuple of (small_model, large_model). small_model is None when the
+            cascade is disabled (TIER_SMALL_MODEL empty or same as large model)
+            or the small model isn't pulled on the Ollama server.
+            large_model is None to use the default OLLAMA_MODEL.
+        """
+        try:
+            small_model = current_app.config.get('TIER_SMALL_MODEL')
+            large_model = current_app.config.get('TIER_LARGE_MODEL')
+        except RuntimeError:
+            small_model = os.environ.get('TIER_SMALL_MODEL')
+            large_model = os.environ.get('TIER_LARGE_MODEL')
+        
+        large_model = large_model or None
+        if not small_model or small_model == large_model:
+            return None, large_model
+        
+        # A missing small model would fail every call before escalating
+        available_models = cls.get_available_models()
+        if small_model not in available_models and f"{small_model}:latest" not in available_models:
+            print(f"⚠️ Cascade model {small_model} not available on Ollama server - using {large_model or 'default model'} only")
+            return None, large_model
+        
+        return small_model, large_model
@@ -5,9 +5,242 @@ Uses Tesseract OCR for text extraction from images and scanned PDFs
 import pytesseract
 from PIL import Image
 import pdf2image
+import contextlib
+import hashlib
+import logging
 import os
-from typing import Tuple, Optional, Dict
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
 import PyPDF2
+from utils.disk_cache import DiskCache
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:  # PyMuPDF not installed - rasterize with pdf2image (Poppler)
+    fitz = None
+
+try:
+    import tesserocr
+except ImportError:  # tesserocr not installed - run the tesseract CLI via pytesseract
+    tesserocr = None
+
+
+logger = logging.getLogger(__name__)
+
+
+# Scanned PDFs: only the first N pages are OCR'd (for performance)
+MAX_OCR_PAGES = int(os.environ.get('MAX_OCR_PAGES', '10'))
+
+# Pages of one scanned PDF OCR'd at the same time. Deployments should set
+# OMP_THREAD_LIMIT=1 (see Dockerfile) so Tesseract's own OpenMP threading
+# doesn't oversubscribe the CPUs when pages run concurrently. This default is
+# for in-process OCR; document_processor's OCR worker processes are resized
+# by init_ocr_worker so all of them together stay within their CPU share
+OCR_PAGE_WORKERS = max(1, int(os.environ.get('OCR_PAGE_WORKERS', (os.cpu_count() or 4) // 4)))
+
+# Rasterization resolution for scanned PDF pages (grayscale)
+OCR_DPI = int(os.environ.get('OCR_DPI', '150'))
+
+# Pages rasterized per pdf2image call when PyMuPDF isn't available, so a long
+# PDF is never fully rendered into memory at once
+OCR_RENDER_CHUNK = 10
+
+# Images are downscaled so their long edge is at most this many pixels before
+# OCR (Tesseract time grows with pixel count; ~150 DPI is enough for text)
+OCR_MAX_EDGE = int(os.environ.get('OCR_MAX_EDGE', '2500'))
+
+# OCR results cached on disk by page image hash
+OCR_CACHE_DIR = os.environ.get(
+    'OCR_CACHE_DIR',
+    os.path.join(tempfile.gettempdir(), 'dochub_ocrcache')
+)
+OCR_CACHE_MAX_ENTRIES = int(os.environ.get('OCR_CACHE_MAX_ENTRIES', '10000'))
+_ocr_cache = DiskCache(OCR_CACHE_DIR, OCR_CACHE_MAX_ENTRIES)
+
+# Both Tesseract backends run outside the GIL (tesserocr releases it, pytesseract
+# runs a subprocess), so threads are enough to OCR pages in parallel
+_page_executor = ThreadPoolExecutor(max_workers=OCR_PAGE_WORKERS, thread_name_prefix='ocrpage')
+
+# One tesserocr API per thread - an API instance isn't thread-safe, and keeping
+# it alive means the language model is loaded once instead of per page
+_tess_local = threading.local()
+
+
+def _open_pdf(pdf_path: str, doc=None):
+    """
+    Context manager giving a PyMuPDF document for pdf_path
+    Reuses doc if given (left open for its owner); yields None without PyMuPDF
+    """
+    if doc is not None or fitz is None:
+        return contextlib.nullcontext(doc)
+    return fitz.open(pdf_path)
+
+
+def _sample_pages(page_count: int) -> List[int]:
+    """Indexes of the first, middle and last page"""
+    return sorted({0, page_count // 2, page_count - 1}) if page_count else []
+
+
+def _pdf_page_count(pdf_path: str, doc=None) -> int:
+    """Number of pages in a PDF"""
+    if fitz is not None:
+        with _open_pdf(pdf_path, doc) as pdf:
+            return pdf.page_count
+    
+    with open(pdf_path, 'rb') as f:
+        return len(PyPDF2.PdfReader(f).pages)
+
+
+def _render_pages(pdf_path: str, page_count: int, doc=None) -> Iterator:
+    """
+    Render the first page_count pages of a PDF as grayscale images for OCR
+    With PyMuPDF pages are rendered one at a time as they are consumed;
+    the pdf2image (Poppler) fallback converts OCR_RENDER_CHUNK pages per call
+    """
+    if fitz is None:
+        for first_page in range(1, page_count + 1, OCR_RENDER_CHUNK):
+            yield from pdf2image.convert_from_path(
+                pdf_path,
+                dpi=OCR_DPI,
+                first_page=first_page,
+                last_page=min(first_page + OCR_RENDER_CHUNK - 1, page_count),
+                grayscale=True
+            )
+        return
+    
+    with _open_pdf(pdf_path, doc) as pdf:
+        for i in range(page_count):
+            pix = pdf.load_page(i).get_pixmap(dpi=OCR_DPI, colorspace=fitz.csGRAY)
+            yield Image.frombytes("L", (pix.width, pix.height), pix.samples)
+
+
+def _submit_pages(images: Iterable) -> Iterator[Future]:
+    """
+    Submit page images to the OCR executor, yielding their futures in page order
+    At most 2 * OCR_PAGE_WORKERS pages are rendered but not yet consumed at a
+    time, so memory doesn't grow with the page count
+    """
+    pending = deque()
+    for image in images:
+        pending.append(_page_executor.submit(_ocr_page, image))
+        if len(pending) >= 2 * OCR_PAGE_WORKERS:
+            yield pending.popleft()
+    while pending:
+        yield pending.popleft()
+
+
+def _iter_confidences(confidences) -> Iterator[float]:
+    """Parse confidences one by one, skipping values that aren't numbers"""
+    for conf in confidences:
+        try:
+            yield float(conf)
+        except (ValueError, TypeError):
+            continue
+
+
+def _mean_confidence(confidences) -> float:
+    """Mean word confidence from image_to_data, excluding -1 (non-word boxes)"""
+    # Handle both string and int values from OCR - numpy converts them in one pass
+    try:
+        parsed = np.asarray(confidences, dtype=np.float32)
+    except (ValueError, TypeError):
+        parsed = np.fromiter(_iter_confidences(confidences), dtype=np.float32)
+    parsed = parsed[parsed != -1]
+    return float(parsed.mean()) if parsed.size else 0.0
+
+
+def _prepare_image(image):
+    """Convert image to grayscale and cap its long edge at OCR_MAX_EDGE"""
+    image = image.convert('L')
+    if max(image.size) > OCR_MAX_EDGE:
+        image.thumbnail((OCR_MAX_EDGE, OCR_MAX_EDGE), Image.Resampling.LANCZOS)
+    return image
+
+
+def _image_hash(image) -> str:
+    """Hash image pixels (plus mode/size/OCR language, which change the result)"""
+    digest = hashlib.blake2b(f"{image.mode}|{image.size}|eng|".encode('utf-8'), digest_size=16)
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def _text_from_data(data: Dict) -> Tuple[str, int]:
+    """
+    Rebuild page text from image_to_data output
+    Words on the same line are space-joined; a blank line separates blocks/paragraphs
+    
+    Returns:
+        Tuple of (text, word count)
+    """
+    lines = []
+    words = []
+    current = None
+    word_count = 0
+    for word, block, par, line in zip(data['text'], data['block_num'], data['par_num'], data['line_num']):
+        # Handle both string and None values (non-word rows have empty text)
+        if not word or not isinstance(word, str) or not word.strip():
+            continue
+        key = (block, par, line)
+        if key != current:
+            if words:
+                lines.append(' '.join(words))
+                words = []
+            if current is not None and key[:2] != current[:2]:
+                lines.append('')
+            current = key
+        words.append(word.strip())
+        word_count += 1
+    if words:
+        lines.append(' '.join(words))
+    return '\n'.join(lines), word_count
+
+
+def _get_tess_api():
+    """Get this thread's tesserocr API (created on first use)"""
+    api = getattr(_tess_local, 'api', None)
+    if api is None:
+        api = tesserocr.PyTessBaseAPI(lang='eng', psm=tesserocr.PSM.AUTO)
+        _tess_local.api = api
+    return api
+
+
+def _ocr_page(image) -> Tuple[str, float, int]:
+    """
+    OCR one page image (grayscale, downscaled if very large)
+    Results are cached on disk by pixel hash, so re-uploaded scans (and
+    identical pages) skip Tesseract
+    
+    Returns:
+        Tuple of (text, mean word confidence, word count)
+    """
+    image = _prepare_image(image)
+    image_hash = _image_hash(image)
+    cached = _ocr_cache.get(image_hash)
+    if cached:
+        return cached['text'], cached['confidence'], cached['word_count']
+    
+    if tesserocr is not None:
+        api = _get_tess_api()
+        api.SetImage(image)
+        text = api.GetUTF8Text()
+        # One confidence per recognized word
+        confidences = api.AllWordConfidences()
+        word_count = len(confidences)
+        api.Clear()
+    else:
+        # One Tesseract run gives words, layout and confidences - the text is
+        # rebuilt from it instead of running image_to_string as well
+        data = pytesseract.image_to_data(image, lang='eng', output_type=pytesseract.Output.DICT)
+        text, word_count = _text_from_data(data)
+        confidences = data['conf']
+    confidence = _mean_confidence(confidences)
+    
+    _ocr_cache.set(image_hash, {'text': text, 'confidence': confidence, 'word_count': word_count})
+    return text, confidence, word_count
 
 
 class OCRHelper:
@@ -27,37 +260,50 @@ class OCRHelper:
         elif os.environ.get('TESSERACT_CMD'):
             pytesseract.pytesseract.tesseract_cmd = os.environ.get('TESSERACT_CMD')
     
-    def is_scanned_pdf(self, pdf_path: str) -> bool:
+    def is_scanned_pdf(self, pdf_path: str, doc=None) -> bool:
         """
         Check if PDF is scanned (image-based) or text-based
+        Samples the first, middle and last page, so the cost doesn't grow with page count
         
         Args:
             pdf_path: Path to PDF file
+            doc: Already opened PyMuPDF document for pdf_path (optional)
             
         Returns:
             True if PDF appears to be scanned (image-based)
         """
         try:
-            with open(pdf_path, 'rb') as f:
-                pdf_reader = PyPDF2.PdfReader(f)
-                # Check first few pages for text
-                pages_to_check = min(3, len(pdf_reader.pages))
-                total_text_length = 0
-                
-                for i in range(pages_to_check):
-                    try:
-                        page_text = pdf_reader.pages[i].extract_text()
-                        total_text_length += len(page_text.strip())
-                    except:
-                        pass
-                
-                # If very little text across first few pages, likely scanned
-                # Threshold: less than 100 characters per page on average
-                avg_text_per_page = total_text_length / pages_to_check if pages_to_check > 0 else 0
-                return avg_text_per_page < 100
+            if fitz is not None:
+                with _open_pdf(pdf_path, doc) as pdf:
+                    page_count = pdf.page_count
+                    sample_pages = _sample_pages(page_count)
+                    # PyMuPDF text extraction is native and much cheaper than PyPDF2's
+                    total_text_length = sum(
+                        len(pdf.load_page(i).get_text("text").strip()) for i in sample_pages
+                    )
+            else:
+                with open(pdf_path, 'rb') as f:
+                    pdf_reader = PyPDF2.PdfReader(f)
+                    # Check sample pages for text
+                    page_count = len(pdf_reader.pages)
+                    sample_pages = _sample_pages(page_count)
+                    total_text_length = 0
+                    
+                    for i in sample_pages:
+                        try:
+                            page_text = pdf_reader.pages[i].extract_text()
+                            total_text_length += len(page_text.strip())
+                        except:
+                            pass
+            
+            # If very little text across the sampled pages, likely scanned
+            # Threshold: less than 100 characters per page on average
+            pages_to_check = len(sample_pages)
+            avg_text_per_page = total_text_length / pages_to_check if pages_to_check > 0 else 0
+            return avg_text_per_page < 100
                 
         except Exception as e:
-            print(f"⚠️ Error checking if PDF is scanned: {str(e)}")
+            logger.warning("⚠️ Error checking if PDF is scanned: %s", e)
             # If we can't determine, assume it might be scanned
             return True
     
@@ -72,32 +318,11 @@ class OCRHelper:
             Tuple of (extracted_text, metadata)
         """
         try:
-            print(f"🔍 Extracting text from image: {image_path}")
+            logger.info("🔍 Extracting text from image: %s", image_path)
             image = Image.open(image_path)
             
-            # OCR with detailed output
-            text = pytesseract.image_to_string(image, lang='eng')
-            
-            # Get OCR metadata for confidence scoring
-            data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
-            
-            # Calculate average confidence (exclude -1 values)
-            # Handle both string and int values from OCR
-            confidences = []
-            for conf in data['conf']:
-                if conf == -1 or conf == '-1':
-                    continue
-                try:
-                    # Convert to int if string, or use directly if int
-                    conf_int = int(conf) if isinstance(conf, str) else conf
-                    confidences.append(conf_int)
-                except (ValueError, TypeError):
-                    continue
-            avg_confidence = sum(confidences) / len(confidences) if confidences else 0
-            
-            # Count words (handle both string and None values)
-            words = [w for w in data['text'] if w and (isinstance(w, str) and w.strip())]
-            word_count = len(words)
+            # OCR with detailed output (text + confidences for scoring)
+            text, avg_confidence, word_count = _ocr_page(image)
             
             metadata = {
                 'confidence': round(avg_confidence, 2),
@@ -106,14 +331,15 @@ class OCRHelper:
                 'method': 'tesseract_ocr'
             }
             
-            print(f"✅ Extracted {word_count} words with {avg_confidence:.1f}% confidence")
+            logger.info("✅ Extracted %d words with %.1f%% confidence", word_count, avg_confidence)
             return text.strip(), metadata
             
         except Exception as e:
-            print(f"❌ OCR extraction failed: {str(e)}")
+            logger.error("❌ OCR extraction failed: %s", e)
             raise Exception(f"OCR extraction failed: {str(e)}")
     
-    def extract_from_pdf(self, pdf_path: str, max_pages: int = 10) -> Tuple[str, Dict]:
+    def extract_from_pdf(self, pdf_path: str, max_pages: Optional[int] = MAX_OCR_PAGES,
+                         doc=None) -> Tuple[str, Dict]:
         """
         Extract text from scanned PDF using OCR
         
@@ -121,84 +347,64 @@ class OCRHelper:
             pdf_path: Path to PDF file
             max_pages: Maximum pages to process (for performance)
                       Set to None to process all pages
+            doc: Already opened PyMuPDF document for pdf_path (optional)
             
         Returns:
             Tuple of (extracted_text, metadata)
         """
         try:
-            print(f"🔍 Extracting text from scanned PDF: {pdf_path}")
+            logger.info("🔍 Extracting text from scanned PDF: %s", pdf_path)
             
             # Convert PDF pages to images
             # First, determine how many pages to process
-            with open(pdf_path, 'rb') as f:
-                pdf_reader = PyPDF2.PdfReader(f)
-                total_pages = len(pdf_reader.pages)
+            total_pages = _pdf_page_count(pdf_path, doc)
             
             # Limit pages for performance
             pages_to_process = min(max_pages, total_pages) if max_pages else total_pages
             
-            print(f"📄 Processing {pages_to_process} of {total_pages} pages...")
+            logger.info("📄 Processing %d of %d pages...", pages_to_process, total_pages)
             
-            # Convert PDF to images
-            images = pdf2image.convert_from_path(
-                pdf_path, 
-                first_page=1, 
-                last_page=pages_to_process
-            )
+            # Convert PDF to images (rendered lazily, as OCR workers free up)
+            images = _render_pages(pdf_path, pages_to_process, doc)
             
-            full_text = ""
+            page_texts = []
             total_confidence = 0
             word_count = 0
             pages_processed = 0
             
-            for i, image in enumerate(images):
+            # OCR pages concurrently (each call runs its own Tesseract process)
+            for i, future in enumerate(_submit_pages(images)):
                 try:
-                    page_text = pytesseract.image_to_string(image, lang='eng')
-                    full_text += f"\n--- Page {i+1} ---\n{page_text}\n"
-                    
-                    # Get confidence for this page
-                    data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
-                    # Handle both string and int values from OCR
-                    page_confidences = []
-                    for c in data['conf']:
-                        if c == -1 or c == '-1':
-                            continue
-                        try:
-                            # Convert to int if string, or use directly if int
-                            conf_int = int(c) if isinstance(c, str) else c
-                            page_confidences.append(conf_int)
-                        except (ValueError, TypeError):
-                            continue
-                    
-                    if page_confidences:
-                        page_avg_confidence = sum(page_confidences) / len(page_confidences)
-                        total_confidence += page_avg_confidence
+                    page_text, page_avg_confidence, page_word_count = future.result()
+                    page_texts.append(f"\n--- Page {i+1} ---\n{page_text}\n")
+                    total_confidence += page_avg_confidence
                     
-                    # Handle both string and None values
-                    page_words = [w for w in data['text'] if w and (isinstance(w, str) and w.strip())]
-                    word_count += len(page_words)
+                    word_count += page_word_count
                     pages_processed += 1
                     
-                    print(f"  ✓ Processed page {i+1}/{pages_to_process}")
+                    logger.debug("  ✓ Processed page %d/%d", i + 1, pages_to_process)
                     
                 except Exception as page_error:
-                    print(f"  ⚠️ Error processing page {i+1}: {str(page_error)}")
+                    logger.warning("  ⚠️ Error processing page %d: %s", i + 1, page_error)
                     continue
             
+            full_text = "".join(page_texts)
+            
             metadata = {
                 'confidence': round(total_confidence / pages_processed, 2) if pages_processed > 0 else 0,
                 'word_count': word_count,
                 'page_count': pages_processed,
                 'total_pages': total_pages,
                 'pages_processed': pages_processed,
+                'truncated': total_pages > pages_to_process,
                 'method': 'tesseract_ocr_pdf'
             }
             
-            print(f"✅ Extracted {word_count} words from {pages_processed} pages")
+            logger.info("✅ Extracted %d words from %d pages", word_count, pages_processed)
             return full_text.strip(), metadata
             
         except Exception as e:
-            print(f"❌ PDF OCR extraction failed: {str(e)}")
+            logger.error("❌ PDF OCR extraction failed: %s", e)
             raise Exception(f"PDF OCR extraction failed: {str(e)}")
     
     def extract_text(self, file_path: str, file_type: str) -> Tuple[str, Dict]:
@@ -220,17 +426,77 @@ class OCRHelper:
         
         # PDF files - check if scanned first
         elif file_type_lower == 'pdf':
-            if self.is_scanned_pdf(file_path):
-                print("📸 Detected scanned PDF - using OCR")
-                return self.extract_from_pdf(file_path)
-            else:
-                print("📄 Detected digital PDF - text extraction handled elsewhere")
-                # Digital PDFs are handled by existing PDF extraction in s3.py
-                return "", {
-                    'note': 'Digital PDF - use existing text extraction',
-                    'method': 'digital_pdf'
-                }
+            # Open once for both the scan check and OCR rendering (None without PyMuPDF)
+            with _open_pdf(file_path) as doc:
+                if self.is_scanned_pdf(file_path, doc):
+                    logger.info("📸 Detected scanned PDF - using OCR")
+                    return self.extract_from_pdf(file_path, doc=doc)
+            
+            logger.info("📄 Detected digital PDF - text extraction handled elsewhere")
+            # Digital PDFs are handled by existing PDF extraction in s3.py
+            return "", {
+                'note': 'Digital PDF - use existing text extraction',
+                'method': 'digital_pdf'
+            }
         
         else:
             raise ValueError(f"Unsupported file type for OCR: {file_type}")
 
+
+
+def init_ocr_worker(page_workers: int):
+    """
+    Process pool initializer: size the page thread pool of an OCR worker
+    process (an explicit OCR_PAGE_WORKERS setting is kept)
+    
+    Args:
+        page_workers: Pages OCR'd at the same time in this process
+    """
+    global OCR_PAGE_WORKERS, _page_executor
+    
+    if 'OCR_PAGE_WORKERS' in os.environ:
+        return
+    
+    # No page has been submitted yet in a fresh worker, so the old executor has no threads
+    OCR_PAGE_WORKERS = max(1, page_workers)
+    _page_executor = ThreadPoolExecutor(max_workers=OCR_PAGE_WORKERS, thread_name_prefix='ocrpage')
+
+
+def ocr_extract(file_path: str, file_type: str) -> Tuple[str, Dict]:
+    """
+    OCR a file the caller already decided needs it (module-level, so it is
+    picklable and can run in document_processor's OCR process pool)
+    PDFs go straight to extract_from_pdf - the scanned check isn't repeated
+    
+    Args:
+        file_path: Path to image or scanned PDF
+        file_type: File extension (pdf, jpg, png, etc.)
+        
+    Returns:
+        Tuple of (extracted_text, metadata)
+    """
+    helper = get_ocr_helper()
+    if file_type.lower() == 'pdf':
+        return helper.extract_from_pdf(file_path)
+    return helper.extract_from_image(file_path)
+
+
+_ocr_helper = None
+_ocr_helper_lock = threading.Lock()
+
+
+def get_ocr_helper() -> OCRHelper:
+    """
+    Get shared OCR helper instance (created once per process, on first use)
+    
+    Returns:
+        OCRHelper
+    """
+    global _ocr_helper
+    
+    if _ocr_helper is None:
+        with _ocr_helper_lock:
+            if _ocr_helper is None:
+                _ocr_helper = OCRHelper()
+    
+    return _ocr_helper
@@ -2,16 +2,46 @@
 Ollama Helper - Wrapper for Ollama API calls
 Provides easy interface to interact with Ollama models
 """
+import logging
 import os
 import requests
-import json
-from typing import Optional, Dict, List
+from requests.adapters import HTTPAdapter
+import time
+from typing import Optional, Dict, List, Tuple
 from flask import current_app
+from utils import json_utils
+
+
+logger = logging.getLogger(__name__)
+
+
+# Request bodies are serialized by json_utils (orjson when installed)
+_JSON_HEADERS = {'Content-Type': 'application/json'}
+
+# Keep-alive connections pooled per Ollama host - sized for the concurrent
+# document/chat workers so requests don't open throwaway extra sockets
+OLLAMA_POOL_SIZE = max(1, int(os.environ.get('OLLAMA_POOL_SIZE', '8')))
+
+# How long (seconds) a connection check result is reused
+CONNECTION_CHECK_TTL = 30
+
+# base_url -> (checked_at, reachable)
+_connection_checks: Dict[str, Tuple[float, bool]] = {}
+
+# base_url -> reachable at first probe (see OllamaHelper.probe_once)
+_probe_results: Dict[str, bool] = {}
 
 
 class OllamaHelper:
     """Helper class for interacting with Ollama API"""
     
+    # Shared by all instances so TCP connections to Ollama are kept alive and
+    # reused instead of reconnecting on every call
+    _session = requests.Session()
+    _adapter = HTTPAdapter(pool_connections=OLLAMA_POOL_SIZE, pool_maxsize=OLLAMA_POOL_SIZE)
+    _session.mount("http://", _adapter)
+    _session.mount("https://", _adapter)
+    
     def __init__(self, base_url: Optional[str] = None, model: Optional[str] = None):
         """
         Initialize Ollama helper
@@ -32,27 +62,51 @@ class OllamaHelper:
         # Ensure base_url doesn't end with /
         self.base_url = self.base_url.rstrip('/')
         
-        print(f"🤖 Ollama initialized: {self.base_url} | Model: {self.model}")
+        logger.info("🤖 Ollama initialized: %s | Model: %s", self.base_url, self.model)
     
     def set_model(self, model: str):
         """Dynamically change the model"""
         old_model = self.model
         self.model = model
-        print(f"🔄 Model changed: {old_model} → {self.model}")
+        logger.info("🔄 Model changed: %s → %s", old_model, self.model)
     
     def check_connection(self) -> bool:
         """
         Check if Ollama server is accessible
+        The result is reused for CONNECTION_CHECK_TTL seconds per server
         
         Returns:
             True if connection successful
         """
+        now = time.monotonic()
+        cached = _connection_checks.get(self.base_url)
+        if cached and now - cached[0] < CONNECTION_CHECK_TTL:
+            return cached[1]
+        
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
-            return response.status_code == 200
+            response = self._session.get(f"{self.base_url}/api/tags", timeout=5)
+            reachable = response.status_code == 200
         except Exception as e:
-            print(f"❌ Ollama connection failed: {str(e)}")
-            return False
+            logger.error("❌ Ollama connection failed: %s", e)
+            reachable = False
+        
+        _connection_checks[self.base_url] = (now, reachable)
+        return reachable
+    
+    def probe_once(self) -> bool:
+        """
+        Check the connection once per process (per server), warning if it fails
+        Used by the AI helper classes at construction instead of probing per instance
+        
+        Returns:
+            True if the server was reachable at the first probe
+        """
+        if self.base_url not in _probe_results:
+            reachable = self.check_connection()
+            if not reachable:
+                logger.warning("⚠️ Warning: Ollama connection check failed. Will attempt anyway.")
+            _probe_results[self.base_url] = reachable
+        return _probe_results[self.base_url]
     
     def generate(self, prompt: str, system_prompt: Optional[str] = None, 
                  temperature: float = 0.3, max_tokens: Optional[int] = None,
@@ -91,27 +145,27 @@ class OllamaHelper:
             if format:
                 payload["format"] = format
             
-            print(f"📤 Sending request to Ollama ({self.model})...")
-            response = requests.post(url, json=payload, timeout=120)
+            logger.debug("📤 Sending request to Ollama (%s)...", self.model)
+            response = self._session.post(url, data=json_utils.dumps_bytes(payload), headers=_JSON_HEADERS, timeout=120)
             
             if response.status_code != 200:
                 error_msg = f"Ollama API error: {response.status_code} - {response.text}"
-                print(f"❌ {error_msg}")
+                logger.error("❌ %s", error_msg)
                 return {"response": None, "error": error_msg}
             
-            result = response.json()
+            result = json_utils.loads(response.content)
             generated_text = result.get("response", "").strip()
             
-            print(f"✅ Received response from Ollama ({len(generated_text)} chars)")
+            logger.debug("✅ Received response from Ollama (%d chars)", len(generated_text))
             return {"response": generated_text, "error": None}
             
         except requests.exceptions.Timeout:
             error_msg = "Ollama request timed out"
-            print(f"❌ {error_msg}")
+            logger.error("❌ %s", error_msg)
             return {"response": None, "error": error_msg}
         except Exception as e:
             error_msg = f"Ollama request failed: {str(e)}"
-            print(f"❌ {error_msg}")
+            logger.error("❌ %s", error_msg)
             return {"response": None, "error": error_msg}
     
     def chat(self, messages: List[Dict[str, str]], temperature: float = 0.3,
@@ -144,27 +198,27 @@ class OllamaHelper:
             if format:
                 payload["format"] = format
             
-            print(f"📤 Sending chat request to Ollama ({self.model})...")
-            response = requests.post(url, json=payload, timeout=120)
+            logger.debug("📤 Sending chat request to Ollama (%s)...", self.model)
+            response = self._session.post(url, data=json_utils.dumps_bytes(payload), headers=_JSON_HEADERS, timeout=120)
             
             if response.status_code != 200:
                 error_msg = f"Ollama API error: {response.status_code} - {response.text}"
-                print(f"❌ {error_msg}")
+                logger.error("❌ %s", error_msg)
                 return {"response": None, "error": error_msg}
             
-            result = response.json()
+            result = json_utils.loads(response.content)
             generated_text = result.get("message", {}).get("content", "").strip()
             
-            print(f"✅ Received chat response from Ollama ({len(generated_text)} chars)")
+            logger.debug("✅ Received chat response from Ollama (%d chars)", len(generated_text))
             return {"response": generated_text, "error": None}
             
         except requests.exceptions.Timeout:
             error_msg = "Ollama request timed out"
-            print(f"❌ {error_msg}")
+            logger.error("❌ %s", error_msg)
             return {"response": None, "error": error_msg}
         except Exception as e:
             error_msg = f"Ollama request failed: {str(e)}"
-            print(f"❌ {error_msg}")
+            logger.error("❌ %s", error_msg)
             return {"response": None, "error": error_msg}
     
     def chat_stream(self, messages: List[Dict[str, str]], temperature: float = 0.3,
@@ -180,6 +234,7 @@ class OllamaHelper:
         Yields:
             Dict with 'content' (chunk text) and 'done' (bool) keys
         """
+        response = None
         try:
             url = f"{self.base_url}/api/chat"
             
@@ -195,51 +250,147 @@ class OllamaHelper:
             if format:
                 payload["format"] = format
             
-            print(f"📤 Sending streaming chat request to Ollama ({self.model})...")
-            response = requests.post(url, json=payload, stream=True, timeout=120)
+            logger.debug("📤 Sending streaming chat request to Ollama (%s)...", self.model)
+            response = self._session.post(url, data=json_utils.dumps_bytes(payload), headers=_JSON_HEADERS, stream=True, timeout=120)
             
             if response.status_code != 200:
                 error_msg = f"Ollama API error: {response.status_code} - {response.text}"
-                print(f"❌ {error_msg}")
+                logger.error("❌ %s", error_msg)
                 yield {"content": "", "done": True, "error": error_msg}
                 return
             
             # Stream the response
-            for line in response.iter_lines():
+            # Lines are parsed as raw bytes (no per-chunk decode/strip)
+            for line in response.iter_lines(chunk_size=8192):
                 if line:
                     try:
-                        line_text = line.decode('utf-8')
-                        if line_text.strip():
-                            chunk = json.loads(line_text)
-                            
-                            # Check if this is the final chunk
-                            done = chunk.get('done', False)
-                            content = chunk.get('message', {}).get('content', '')
-                            
-                            yield {
-                                "content": content,
-                                "done": done,
-                                "error": None
-                            }
-                            
-                            if done:
-                                print(f"✅ Streaming complete")
-                                break
-                    except json.JSONDecodeError:
+                        chunk = json_utils.loads(line)
+                        
+                        # Check if this is the final chunk
+                        done = chunk.get('done', False)
+                        content = chunk.get('message', {}).get('content', '')
+                        
+                        yield {
+                            "content": content,
+                            "done": done,
+                            "error": None
+                        }
+                        
+                        if done:
+                            logger.debug("✅ Streaming complete")
+                            break
+                    except json_utils.JSONDecodeError:
                         continue
                     except Exception as e:
-                        print(f"⚠️ Error parsing stream chunk: {str(e)}")
+                        logger.debug("⚠️ Error parsing stream chunk: %s", e)
                         continue
             
         except requests.exceptions.Timeout:
             error_msg = "Ollama request timed out"
-            print(f"❌ {error_msg}")
+            logger.error("❌ %s", error_msg)
             yield {"content": "", "done": True, "error": error_msg}
         except Exception as e:
             error_msg = f"Ollama streaming failed: {str(e)}"
-            print(f"❌ {error_msg}")
+            logger.error("❌ %s", error_msg)
             yield {"content": "", "done": True, "error": error_msg}
+        finally:
+            # Closing the connection early (consumer stopped iterating) aborts generation
+            if response is not None:
+                response.close()
+    
+    def chat_json(self, messages: List[Dict[str, str]], temperature: float = 0.3) -> Dict:
+        """
+        Chat completion for JSON responses
+        Streams the response and stops as soon as the top-level JSON value is
+        complete, instead of waiting for any trailing tokens
+        
+        Args:
+            messages: List of message dicts with 'role' and 'content'
+            temperature: Temperature for generation
+            
+        Returns:
+            Dict with 'response' and 'error' keys (same as chat())
+        """
+        parts = []
+        depth = 0
+        started = False
+        in_string = False
+        escaped = False
+        complete = False
+        
+        stream = self.chat_stream(messages, temperature=temperature, format="json")
+        try:
+            for chunk in stream:
+                if chunk.get('error'):
+                    return {"response": None, "error": chunk['error']}
+                
+                content = chunk.get('content', '')
+                begin = 0
+                for i, ch in enumerate(content):
+                    if in_string:
+                        if escaped:
+                            escaped = False
+                        elif ch == '\\':
+                            escaped = True
+                        elif ch == '"':
+                            in_string = False
+                    elif ch == '"':
+                        in_string = started
+                    elif ch in '{[':
+                        if not started:
+                            # Drop any preamble (e.g. a ```json fence) before the value
+                            begin = i
+                            started = True
+                        depth += 1
+                    elif ch in '}]':
+                        depth -= 1
+                        if started and depth == 0:
+                            content = content[:i + 1]
+                            complete = True
+                            break
+                
+                if started:
+                    parts.append(content[begin:])
+                if complete or chunk.get('done'):
+                    break
+        finally:
+            stream.close()
+        
+        return {"response": "".join(parts).strip(), "error": None}
     
+    def embed(self, text: str, model: Optional[str] = None,
+              timeout: float = 30) -> Optional[List[float]]:
+        """
+        Get embedding vector for text using Ollama
+
+        Args:
+            text: Text to embed
+            model: Embedding model (defaults to OLLAMA_EMBED_MODEL env var)
+            timeout: Request timeout in seconds
+
+        Returns:
+            Embedding vector or None if error
+        """
+        try:
+            url = f"{self.base_url}/api/embeddings"
+
+            payload = {
+                "model": model or os.environ.get('OLLAMA_EMBED_MODEL', 'nomic-embed-text'),
+                "prompt": text
+            }
+
+            response = self._session.post(url, data=json_utils.dumps_bytes(payload), headers=_JSON_HEADERS, timeout=timeout)
+
+            if response.status_code != 200:
+                logger.warning("⚠️ Ollama embedding error: %s - %s", response.status_code, response.text)
+                return None
+
+            return json_utils.loads(response.content).get("embedding") or None
+
+        except Exception as e:
+            logger.warning("⚠️ Ollama embedding failed: %s", e)
+            return None
+
     def generate_json(self, prompt: str, system_prompt: Optional[str] = None,
                      temperature: float = 0.3) -> Optional[Dict]:
         """
@@ -264,18 +415,10 @@ class OllamaHelper:
             return None
         
         try:
-            # Try to parse JSON
-            response_text = result["response"]
-            
-            # Clean up if wrapped in markdown code blocks
-            if "```json" in response_text:
-                response_text = response_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in response_text:
-                response_text = response_text.split("```")[1].split("```")[0].strip()
-            
-            return json.loads(response_text)
-        except json.JSONDecodeError as e:
-            print(f"⚠️ Failed to parse JSON response: {str(e)}")
-            print(f"Response was: {result['response'][:200]}")
+            # Parse JSON (cleaned up if wrapped in markdown code blocks)
+            return json_utils.parse_model_json(result["response"])
+        except json_utils.JSONDecodeError as e:
+            logger.warning("⚠️ Failed to parse JSON response: %s", e)
+            logger.debug("Response was: %s", result['response'][:200])
             return None
 
@@ -5,6 +5,7 @@ Provides easy access to S3 operations
 from flask import current_app
 import sys
 import os
+import threading
 
 # Add parent directory to path to import s3.py
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -12,24 +13,33 @@ from s3 import RenderS3Client
 from database import get_mysql_config
 
 
-_s3_client = None
+# (api_base_url, mysql config items) -> RenderS3Client
+_s3_clients = {}
+_s3_clients_lock = threading.Lock()
 
 
 def get_s3_client():
     """
     Get or create S3 client instance
-    Uses configuration from Flask app
+    Uses configuration from Flask app (one shared client per configuration)
     """
-    global _s3_client
+    api_base_url = current_app.config['S3_API_BASE_URL']
+    mysql_config = get_mysql_config()
+    key = (api_base_url, tuple(sorted(mysql_config.items())))
     
-    if _s3_client is None:
-        mysql_config = get_mysql_config()
-        _s3_client = RenderS3Client(
-            api_base_url=current_app.config['S3_API_BASE_URL'],
-            mysql_config=mysql_config
-        )
+    client = _s3_clients.get(key)
+    if client is None:
+        with _s3_clients_lock:
+            # Re-check: another request may have created it while we waited
+            client = _s3_clients.get(key)
+            if client is None:
+                client = RenderS3Client(
+                    api_base_url=api_base_url,
+                    mysql_config=mysql_config
+                )
+                _s3_clients[key] = client
     
-    return _s3_client
+    return client
 
 
 def upload_file(file_path, user_id, custom_file_name=None, module=None, framework_id=None):
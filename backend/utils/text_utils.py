@@ -0,0 +1,26 @@
+"""
+Text Utilities - Helpers for trimming document text before sending it to Ollama
+"""
+
+
+# Inserted between the head and tail of truncated text
+TRUNCATION_MARKER = "\n...[truncated]...\n"
+
+
+def head_tail(text: str, head: int, tail: int) -> str:
+    """
+    Shorten text to its beginning and end
+    Titles/headings and conclusions carry most of the signal for
+    categorization, so this keeps both instead of only the first N chars
+
+    Args:
+        text: Text to shorten
+        head: Characters kept from the start
+        tail: Characters kept from the end
+
+    Returns:
+        Text unchanged if short enough, otherwise head + marker + tail
+    """
+    if len(text) <= head + tail + len(TRUNCATION_MARKER):
+        return text
+    return text[:head] + TRUNCATION_MARKER + text[-tail:]
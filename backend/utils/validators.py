@@ -5,10 +5,21 @@ import re
 from flask import current_app
 
 
+_EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
+# Path separators -> '_', null bytes removed (see sanitize_filename)
+_FILENAME_TABLE = str.maketrans({'/': '_', '\\': '_', '\x00': None})
+
+# Longest valid email address (RFC 5321 path limit)
+MAX_EMAIL_LENGTH = 254
+
+
 def validate_email(email):
     """Validate email format"""
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
+    # Cheap checks first - most invalid input fails without running the regex
+    if not email or '@' not in email or len(email) > MAX_EMAIL_LENGTH:
+        return False
+    return _EMAIL_RE.match(email) is not None
 
 
 def validate_password(password):
@@ -31,18 +42,14 @@ def validate_file_type(filename):
     Returns:
         Boolean indicating if file type is allowed
     """
-    if '.' not in filename:
-        return False
-    
-    ext = filename.rsplit('.', 1)[1].lower()
-    return ext in current_app.config['ALLOWED_EXTENSIONS']
+    ext = get_file_extension(filename)
+    return bool(ext) and ext in current_app.config['ALLOWED_EXTENSIONS']
 
 
 def get_file_extension(filename):
     """Get file extension from filename"""
-    if '.' not in filename:
-        return ''
-    return filename.rsplit('.', 1)[1].lower()
+    _, dot, ext = filename.rpartition('.')
+    return ext.lower() if dot else ''
 
 
 def validate_required_fields(data, required_fields):
@@ -74,11 +81,8 @@ def sanitize_filename(filename):
     Returns:
         Sanitized filename
     """
-    # Remove path components
-    filename = filename.replace('/', '_').replace('\\', '_')
-    # Remove null bytes
-    filename = filename.replace('\x00', '')
-    return filename
+    # Remove path components and null bytes in one pass
+    return filename.translate(_FILENAME_TABLE)
 
 
 